@@ -0,0 +1,165 @@
+#!/usr/bin/python3
+"""
+  Measures how long xmonad-workspace-switcher takes to switch workspaces
+  against a fake i3, and how many round trips to i3 it needs for it.
+
+  A switch is timed from asking for the workspaces until i3 has replied
+  to the last command, for the different kinds of switches the script
+  does. With `--delay`, every reply from the fake i3 takes that many
+  milliseconds, to see how a busy i3 affects it.
+
+  With `--processes`, it instead times what a keypress costs: running
+  the switcher on its own against running xmonad-workspace-client with
+  the daemon.
+
+    ./benchmarks/bench_switcher.py [--runs 200] [--delay 1] [--processes]
+"""
+from importlib.machinery import SourceFileLoader
+import importlib.util
+import subprocess
+import argparse
+import logging
+import tempfile
+import shutil
+import socket
+import time
+import sys
+import os
+
+from fake_i3 import FakeI3, RUN_COMMAND
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SWITCHER_PATH = os.path.join(ROOT, 'xmonad-workspace-switcher')
+CLIENT_PATH = os.path.join(ROOT, 'xmonad-workspace-client')
+
+# (name, setup commands, workspace to switch to), starting with
+# workspace 1 focused on DP-1 and workspace 2 visible on DP-2
+SCENARIOS = [
+  ('new workspace', [], 5),
+  ('same output', ['workspace number 3'], 1),
+  ('other output, visible', [], 2),
+  ('other output, hidden', ['workspace number 2', 'workspace number 4',
+                            'workspace number 1'], 2),
+]
+
+def load_switcher():
+  """Imports the switcher script, which has no .py to import it by"""
+  loader = SourceFileLoader('xmonad_workspace_switcher', SWITCHER_PATH)
+  spec = importlib.util.spec_from_loader(loader.name, loader)
+  module = importlib.util.module_from_spec(spec)
+  loader.exec_module(module)
+  return module
+
+def percentile(values, percent):
+  values = sorted(values)
+  index = min(len(values) - 1, int(round(percent / 100 * (len(values) - 1))))
+  return values[index]
+
+def report(name, timings, round_trips, commands):
+  print('%-24s p50 %7.3fms  p90 %7.3fms  p99 %7.3fms  max %7.3fms  '
+        'round trips %d (commands %d)' % (
+          name,
+          percentile(timings, 50) * 1000,
+          percentile(timings, 90) * 1000,
+          percentile(timings, 99) * 1000,
+          max(timings) * 1000,
+          round_trips, commands))
+
+def bench_functions(i3, runs):
+  """Times switch_workspace itself, in this process"""
+  switcher = load_switcher()
+
+  for name, setup, num in SCENARIOS:
+    timings = []
+
+    for _ in range(runs):
+      i3.reset()
+      for command in setup:
+        switcher.command(command)
+      before = i3.round_trips()
+      before_commands = i3.round_trips(RUN_COMMAND)
+
+      start = time.perf_counter()
+      switcher.switch_workspace(num)
+      timings.append(time.perf_counter() - start)
+
+      round_trips = i3.round_trips() - before
+      commands = i3.round_trips(RUN_COMMAND) - before_commands
+
+    report(name, timings, round_trips, commands)
+
+    focused = [x for x in switcher.i3.get_workspaces() if x.focused]
+    if not focused or focused[0].num != num or \
+       focused[0].output != i3.outputs[0]:
+      print('  switched to the wrong workspace: %s' % i3.commands[-1],
+            file=sys.stderr)
+
+def wait_for_socket(path, timeout=5):
+  end = time.monotonic() + timeout
+  while time.monotonic() < end:
+    try:
+      with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(path)
+        return
+    except OSError:
+      time.sleep(0.01)
+  raise RuntimeError('The daemon did not start')
+
+def bench_processes(i3, runs):
+  """Times running the scripts, like i3 does on a keypress"""
+  runtime_dir = tempfile.mkdtemp(prefix='bench-switcher-')
+  env = dict(os.environ, XDG_RUNTIME_DIR=runtime_dir)
+  socket_path = os.path.join(runtime_dir,
+                             'xmonad-workspace-switcher-%d.sock' % os.getuid())
+
+  daemon = subprocess.Popen([sys.executable, SWITCHER_PATH, '--daemon'],
+                            env=env)
+  try:
+    wait_for_socket(socket_path)
+
+    for name, args in [('switcher', [sys.executable, SWITCHER_PATH]),
+                       ('client and daemon',
+                        [sys.executable, '-S', CLIENT_PATH])]:
+      timings = []
+
+      for run in range(runs):
+        num = str(run % 2 + 1)
+        before = i3.round_trips()
+        before_commands = i3.round_trips(RUN_COMMAND)
+
+        start = time.perf_counter()
+        subprocess.run(args + [num], env=env, check=True)
+        timings.append(time.perf_counter() - start)
+
+        round_trips = i3.round_trips() - before
+        commands = i3.round_trips(RUN_COMMAND) - before_commands
+
+      report(name, timings, round_trips, commands)
+  finally:
+    daemon.terminate()
+    daemon.wait()
+    shutil.rmtree(runtime_dir, ignore_errors=True)
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+  parser.add_argument('--runs', type=int, default=200)
+  parser.add_argument('--delay', type=float, default=0,
+                      help='milliseconds for the fake i3 to reply')
+  parser.add_argument('--processes', action='store_true',
+                      help='time running the scripts instead')
+  args = parser.parse_args()
+
+  i3 = FakeI3(delay=args.delay / 1000)
+  os.environ.update(i3.environ)
+  logging.disable(logging.CRITICAL)
+
+  try:
+    if args.processes:
+      bench_processes(i3, args.runs)
+    else:
+      bench_functions(i3, args.runs)
+  finally:
+    i3.close()
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,342 @@
+"""
+  A fake i3 that speaks enough of the i3 IPC protocol for benchmarking
+  the scripts without a running i3. It keeps a small set of outputs and
+  workspaces, runs the `workspace number` and `move workspace to output`
+  commands on them and sends workspace events to subscribers. Commands
+  for a window of the scratchpad (`[con_id=N] scratchpad show, ...`)
+  are accepted, but do not change the tree.
+
+  Every message is counted, so a benchmark can tell how many round
+  trips a script needed, and `delay` makes each reply take a while, like
+  a busy i3 would.
+
+  The tree can be filled with `windows` on every workspace and
+  `scratchpad_windows` in the scratchpad, to see how the scripts
+  cope with large trees.
+"""
+import threading
+import tempfile
+import socket
+import struct
+import json
+import time
+import os
+
+MAGIC = b'i3-ipc'
+HEADER = struct.Struct('=6sII')
+
+RUN_COMMAND = 0
+GET_WORKSPACES = 1
+SUBSCRIBE = 2
+GET_OUTPUTS = 3
+GET_TREE = 4
+GET_VERSION = 7
+
+EVENT_WORKSPACE = 0x80000000
+
+RECT = {'x': 0, 'y': 0, 'width': 1920, 'height': 1080}
+
+def node(con_id, con_type, name, nodes=(), floating_nodes=(), **fields):
+  """Returns a container of the tree, with the fields every one has"""
+  data = {'id': con_id, 'type': con_type, 'name': name, 'focused': False,
+          'urgent': False, 'rect': RECT, 'nodes': list(nodes),
+          'floating_nodes': list(floating_nodes)}
+  data.update(fields)
+  return data
+
+def recv_exactly(conn, size):
+  data = b''
+  while len(data) < size:
+    chunk = conn.recv(size - len(data))
+    if not chunk:
+      raise ConnectionError('connection closed')
+    data += chunk
+  return data
+
+class FakeI3():
+  """
+    The fake i3, listening on a socket in a temporary directory. Set
+    `I3SOCK` to `socket_path` (or use `environ`) so i3ipc finds it.
+  """
+  def __init__(self, outputs=('DP-1', 'DP-2'), delay=0, windows=0,
+               scratchpad_windows=0):
+    self.outputs = list(outputs)
+    self.delay = delay
+    self.windows = windows
+    self.scratchpad_windows = scratchpad_windows
+    self.lock = threading.Lock()
+    self.subscribers = []
+    self.counts = {}
+    self.commands = []
+    self.directory = tempfile.mkdtemp(prefix='fake-i3-')
+    self.socket_path = os.path.join(self.directory, 'ipc.sock')
+    self.reset()
+
+    self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    self.server.bind(self.socket_path)
+    self.server.listen(16)
+
+    thread = threading.Thread(target=self.accept)
+    thread.daemon = True
+    thread.start()
+
+  @property
+  def environ(self):
+    return {'I3SOCK': self.socket_path}
+
+  def reset(self):
+    """Starts over with workspace N visible on output N, the first focused"""
+    with self.lock:
+      self.workspaces = []
+      for num, output in enumerate(self.outputs, 1):
+        self.workspaces.append({
+          'num': num, 'name': str(num), 'output': output,
+          'visible': True, 'focused': num == 1, 'urgent': False,
+        })
+      self.counts = {}
+      self.commands = []
+
+  def round_trips(self, message_type=None):
+    """Returns the number of messages of `message_type`, or of all types"""
+    if message_type is None:
+      return sum(self.counts.values())
+    return self.counts.get(message_type, 0)
+
+  def close(self):
+    self.server.close()
+    try:
+      os.unlink(self.socket_path)
+      os.rmdir(self.directory)
+    except OSError:
+      pass
+
+  def accept(self):
+    while True:
+      try:
+        conn, _ = self.server.accept()
+      except OSError:
+        return
+
+      thread = threading.Thread(target=self.serve, args=(conn,))
+      thread.daemon = True
+      thread.start()
+
+  def serve(self, conn):
+    try:
+      while True:
+        magic, length, message_type = HEADER.unpack(
+            recv_exactly(conn, HEADER.size))
+        if magic != MAGIC:
+          return
+        payload = recv_exactly(conn, length).decode('utf-8')
+
+        if self.delay:
+          time.sleep(self.delay)
+
+        with self.lock:
+          self.counts[message_type] = self.counts.get(message_type, 0) + 1
+          reply = self.handle(conn, message_type, payload)
+
+        self.send(conn, message_type, reply)
+    except (ConnectionError, OSError):
+      pass
+    finally:
+      with self.lock:
+        if conn in self.subscribers:
+          self.subscribers.remove(conn)
+      conn.close()
+
+  def send(self, conn, message_type, data):
+    payload = json.dumps(data).encode('utf-8')
+    conn.sendall(HEADER.pack(MAGIC, len(payload), message_type) + payload)
+
+  def handle(self, conn, message_type, payload):
+    if message_type == RUN_COMMAND:
+      return self.run_command(payload)
+    elif message_type == GET_WORKSPACES:
+      return [self.workspace_reply(x) for x in self.sorted_workspaces()]
+    elif message_type == SUBSCRIBE:
+      if 'workspace' in json.loads(payload):
+        self.subscribers.append(conn)
+      return {'success': True}
+    elif message_type == GET_OUTPUTS:
+      return [self.output_reply(x) for x in self.outputs]
+    elif message_type == GET_TREE:
+      return self.tree_reply()
+    elif message_type == GET_VERSION:
+      return {'major': 4, 'minor': 22, 'patch': 0,
+              'human_readable': '4.22 (fake)',
+              'loaded_config_file_name': ''}
+    return {'success': False, 'error': 'not supported by the fake'}
+
+  # The state of the fake i3
+
+  def sorted_workspaces(self):
+    return sorted(self.workspaces, key=lambda x: x['num'])
+
+  def workspace_reply(self, workspace):
+    reply = dict(workspace)
+    reply['id'] = 1000 + workspace['num']
+    reply['rect'] = RECT
+    return reply
+
+  def output_reply(self, output):
+    visible = [x for x in self.workspaces
+               if x['output'] == output and x['visible']]
+    return {'name': output, 'active': True, 'primary': False,
+            'current_workspace': visible[0]['name'] if visible else None,
+            'rect': RECT}
+
+  def window_reply(self, con_id, floating=False):
+    window = node(con_id, 'con', 'Window %d - Terminal' % con_id,
+                  window=con_id,
+                  window_properties={'class': 'Termite',
+                                     'instance': 'termite',
+                                     'title': 'Window %d' % con_id})
+
+    # Floating windows are wrapped in a floating_con, like in i3
+    if not floating:
+      return window
+    return node(con_id + 1, 'floating_con', None, [window])
+
+  def tree_reply(self):
+    def workspace_node(workspace):
+      con_id = 100000 * workspace['num']
+      return node(1000 + workspace['num'], 'workspace', workspace['name'],
+                  [self.window_reply(con_id + 2 * x)
+                   for x in range(self.windows)],
+                  num=workspace['num'])
+
+    scratchpad = node(10, 'workspace', '__i3_scratch', [],
+                      [self.window_reply(x, True)
+                       for x in self.scratchpad_ids()], num=-1)
+    outputs = [node(2, 'output', '__i3',
+                    [node(3, 'con', 'content', [scratchpad])])]
+
+    for output in self.outputs:
+      workspaces = [workspace_node(x) for x in self.sorted_workspaces()
+                    if x['output'] == output]
+      outputs.append(node(100 + len(outputs), 'output', output,
+                          [node(300 + len(outputs), 'con', 'content',
+                                workspaces)]))
+
+    return node(1, 'root', 'root', outputs)
+
+  def scratchpad_ids(self):
+    """The con_id of the windows in the scratchpad"""
+    return [10000000 + 2 * x for x in range(self.scratchpad_windows)]
+
+  def find(self, num):
+    for workspace in self.workspaces:
+      if workspace['num'] == num:
+        return workspace
+    return None
+
+  def focused(self):
+    for workspace in self.workspaces:
+      if workspace['focused']:
+        return workspace
+    return None
+
+  def show(self, workspace):
+    """Makes `workspace` the visible one on its output"""
+    for other in self.workspaces:
+      if other['output'] == workspace['output']:
+        other['visible'] = other is workspace
+        other['focused'] = False
+
+  def focus(self, workspace):
+    old = self.focused()
+    for other in self.workspaces:
+      other['focused'] = False
+    self.show(workspace)
+    workspace['focused'] = True
+    self.event('focus', workspace, old)
+
+  def free_number(self):
+    num = 1
+    while self.find(num) is not None:
+      num += 1
+    return num
+
+  def run_command(self, payload):
+    self.commands.append(payload)
+    replies = []
+
+    for command in payload.split(';'):
+      command = command.strip()
+      if not command:
+        continue
+      try:
+        self.run_single(command)
+        replies.append({'success': True})
+      except ValueError as e:
+        replies.append({'success': False, 'error': str(e)})
+
+    return replies
+
+  def run_single(self, command):
+    words = command.split()
+
+    if words[0].startswith('[con_id=') and words[0].endswith(']'):
+      con_id = int(words[0][len('[con_id='):-1])
+      if con_id not in self.scratchpad_ids():
+        raise ValueError('No window matches given criteria')
+
+      for action in ' '.join(words[1:]).split(','):
+        if action.strip() not in ('scratchpad show', 'floating toggle'):
+          raise ValueError('Unknown command %r' % action.strip())
+
+    elif words[:2] == ['workspace', 'number'] and len(words) == 3:
+      num = int(words[2])
+      workspace = self.find(num)
+      if workspace is None:
+        workspace = {'num': num, 'name': str(num),
+                     'output': self.focused()['output'],
+                     'visible': False, 'focused': False, 'urgent': False}
+        self.workspaces.append(workspace)
+        self.event('init', workspace)
+      self.focus(workspace)
+
+    elif words[:4] == ['move', 'workspace', 'to', 'output'] and \
+         len(words) == 5:
+      output = words[4]
+      if output not in self.outputs:
+        raise ValueError('No output matched')
+
+      workspace = self.focused()
+      source = workspace['output']
+      if source == output:
+        return
+
+      # The workspace is shown on the new output and the old output
+      # gets another workspace, or a new empty one like in i3
+      workspace['output'] = output
+      self.show(workspace)
+      workspace['focused'] = True
+
+      others = [x for x in self.sorted_workspaces() if x['output'] == source]
+      if others:
+        others[0]['visible'] = True
+      else:
+        new = {'num': self.free_number(), 'output': source,
+               'visible': True, 'focused': False, 'urgent': False}
+        new['name'] = str(new['num'])
+        self.workspaces.append(new)
+        self.event('init', new)
+
+      self.event('move', workspace)
+
+    else:
+      raise ValueError('Unknown command %r' % command)
+
+  def event(self, change, current, old=None):
+    data = {'change': change,
+            'current': self.workspace_reply(current) if current else None,
+            'old': self.workspace_reply(old) if old else None}
+
+    for conn in list(self.subscribers):
+      try:
+        self.send(conn, EVENT_WORKSPACE, data)
+      except OSError:
+        self.subscribers.remove(conn)
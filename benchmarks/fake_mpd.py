@@ -0,0 +1,283 @@
+"""
+  A fake MPD that speaks enough of the MPD protocol for benchmarking
+  lib.mpd without a running MPD. It serves a playlist of songs over a
+  unix socket and keeps a playlist version like MPD does, so
+  `plchanges` only returns the songs that changed.
+
+  The same songs make up the library, which can be searched through
+  `find modified-since` and listed with `listall` and `listallinfo`.
+  `update_library` changes it like an update of the database would, and
+  `has_db_update` leaves the time of it out of `stats`.
+
+  Like the fake i3, every command is counted so a benchmark can tell
+  how many were needed, and `delay` makes each reply take a while.
+  Commands it does not know get an ACK like in MPD. For testing lost
+  connections, `drop_connections` closes the open ones and the commands
+  in `drop_on` close the connection instead of being answered.
+"""
+import threading
+import tempfile
+import socket
+import time
+import os
+
+class Ack(Exception):
+  """Raised by a command to answer it with an ACK"""
+
+class Drop(Exception):
+  """Raised by a command to close the connection instead of answering"""
+
+class FakeMpd():
+  """
+    The fake MPD, listening on `socket_path`, which can be given to
+    MpdClient as the host
+  """
+  def __init__(self, songs=(), delay=0):
+    self.delay = delay
+    self.drop_on = set()
+    self.connections = []
+    self.lock = threading.Lock()
+    self.counts = {}
+    self.state = 'play'
+    self.current = 0
+    self.elapsed = 42.0
+    self.volume = 50
+    self.options = {'repeat': 0, 'random': 0, 'single': 0, 'consume': 0}
+    self.version = 0
+    self.db_update = 0
+    self.has_db_update = True
+    self.library = []
+    self.set_playlist(songs)
+    self.update_library(songs)
+
+    self.directory = tempfile.mkdtemp(prefix='fake-mpd-')
+    self.socket_path = os.path.join(self.directory, 'mpd.sock')
+    self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    self.server.bind(self.socket_path)
+    self.server.listen(16)
+
+    thread = threading.Thread(target=self.accept)
+    thread.daemon = True
+    thread.start()
+
+  def set_playlist(self, songs):
+    """Replaces the playlist with `songs`, a list of tag dictionaries"""
+    with self.lock:
+      self.version += 1
+      self.songs = [dict(x) for x in songs]
+      self.versions = [self.version] * len(self.songs)
+      self.cache = None
+
+  def change_song(self, pos, song):
+    """Replaces the song at `pos`, like moving or adding a song would"""
+    with self.lock:
+      self.version += 1
+      self.songs[pos] = dict(song)
+      self.versions[pos] = self.version
+
+  def update_library(self, songs):
+    """
+      Replaces the library with `songs`, as if MPD updated its database.
+      Songs that were there before and did not change keep their time
+    """
+    with self.lock:
+      self.db_update = max(self.db_update + 1, int(time.time()))
+      old = {x['file']: (x, mtime) for x, mtime in self.library}
+      library = []
+
+      for song in songs:
+        old_song, mtime = old.get(song['file'], (None, None))
+        if old_song != song:
+          mtime = self.db_update
+        library.append((dict(song), mtime))
+
+      self.library = library
+
+  def drop_connections(self):
+    """Closes the open connections, like MPD does with idle clients"""
+    with self.lock:
+      connections, self.connections = self.connections, []
+
+    for conn in connections:
+      try:
+        conn.shutdown(socket.SHUT_RDWR)
+      except OSError:
+        pass
+
+  def count(self, name=None):
+    """Returns how many times `name`, or any command, was run"""
+    if name is None:
+      return sum(self.counts.values())
+    return self.counts.get(name, 0)
+
+  def close(self):
+    self.server.close()
+    try:
+      os.unlink(self.socket_path)
+      os.rmdir(self.directory)
+    except OSError:
+      pass
+
+  def accept(self):
+    while True:
+      try:
+        conn, _ = self.server.accept()
+      except OSError:
+        return
+
+      thread = threading.Thread(target=self.serve, args=(conn,))
+      thread.daemon = True
+      thread.start()
+
+  def serve(self, conn):
+    rfile = conn.makefile('rb')
+    command_list = None
+
+    with self.lock:
+      self.connections.append(conn)
+
+    try:
+      conn.sendall(b'OK MPD 0.23.5\n')
+
+      for line in rfile:
+        line = line.decode('utf-8').rstrip('\n')
+
+        if line == 'command_list_ok_begin':
+          command_list = []
+          continue
+        if command_list is not None and line != 'command_list_end':
+          command_list.append(line)
+          continue
+
+        lines = command_list if command_list is not None else [line]
+        command_list_ok = command_list is not None
+        command_list = None
+        parts = []
+
+        # MPD stops at the first command that fails
+        try:
+          for num, command in enumerate(lines):
+            parts.append(self.run(command))
+            if command_list_ok:
+              parts.append(b'list_OK\n')
+          parts.append(b'OK\n')
+        except Ack as e:
+          parts.append(('ACK [5@%d] {%s} %s\n' % (
+              num, command.split(' ')[0], e)).encode('utf-8'))
+        except Drop:
+          return
+
+        if self.delay:
+          time.sleep(self.delay)
+        conn.sendall(b''.join(parts))
+    except OSError:
+      pass
+    finally:
+      with self.lock:
+        if conn in self.connections:
+          self.connections.remove(conn)
+      rfile.close()
+      conn.close()
+
+  def run(self, command):
+    words = command.split(' ', 1)
+    name = words[0]
+    args = [x.strip('"') for x in words[1:]]
+
+    with self.lock:
+      self.counts[name] = self.counts.get(name, 0) + 1
+
+      if name in self.drop_on:
+        raise Drop()
+
+      if name == 'status':
+        return self.status().encode('utf-8')
+      elif name == 'currentsong':
+        if not self.songs:
+          return b''
+        return self.format_song(self.current).encode('utf-8')
+      elif name == 'playlistinfo':
+        if self.cache is None:
+          self.cache = ''.join(self.format_song(x)
+                               for x in range(len(self.songs)))
+          self.cache = self.cache.encode('utf-8')
+        return self.cache
+      elif name == 'plchanges':
+        since = int(args[0])
+        return ''.join(self.format_song(x) for x, version
+                       in enumerate(self.versions)
+                       if version > since).encode('utf-8')
+      elif name == 'stats':
+        stats = 'songs: %d\n' % len(self.library)
+        if self.has_db_update:
+          stats += 'db_update: %d\n' % self.db_update
+        return stats.encode('utf-8')
+      elif name == 'listall':
+        return ''.join('file: %s\n' % x['file']
+                       for x, _ in self.library).encode('utf-8')
+      elif name == 'listallinfo':
+        return self.format_library(self.library).encode('utf-8')
+      elif name == 'find' and args[0].startswith('(modified-since '):
+        since = int(args[0].split("'")[1])
+        return self.format_library([x for x in self.library
+                                    if x[1] >= since]).encode('utf-8')
+      elif name == 'add':
+        self.version += 1
+        self.songs.append({'file': args[0]})
+        self.versions.append(self.version)
+        self.cache = None
+      elif name == 'setvol':
+        self.volume = int(args[0])
+      elif name in self.options:
+        self.options[name] = int(args[0])
+      elif name == 'pause':
+        if args:
+          self.state = 'pause' if args[0] == '1' else 'play'
+        else:
+          self.state = 'pause' if self.state == 'play' else 'play'
+      elif name == 'play':
+        self.state = 'play'
+        if args:
+          self.current = int(args[0])
+      elif name in ('next', 'previous'):
+        step = 1 if name == 'next' else -1
+        self.current = (self.current + step) % max(1, len(self.songs))
+      else:
+        raise Ack('unknown command "%s"' % name)
+
+    return b''
+
+  def status(self):
+    lines = ['volume: %d' % self.volume]
+    lines += ['%s: %d' % x for x in self.options.items()]
+    lines += ['playlist: %d' % self.version,
+              'playlistlength: %d' % len(self.songs),
+              'state: %s' % self.state]
+    if self.songs:
+      lines += ['song: %d' % self.current,
+                'time: %d:%d' % (self.elapsed, 245),
+                'elapsed: %.3f' % self.elapsed,
+                'duration: 245.000']
+    return '\n'.join(lines) + '\n'
+
+  def format_library(self, library):
+    """
+      Formats the songs of the library with their modification time,
+      and a directory before each of them like MPD has
+    """
+    lines = []
+    for song, mtime in library:
+      modified = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(mtime))
+      lines += ['directory: %s' % os.path.dirname(song['file']),
+                'Last-Modified: %s' % modified,
+                'file: %s' % song['file'],
+                'Last-Modified: %s' % modified]
+      lines += ['%s: %s' % x for x in song.items() if x[0] != 'file']
+    return '\n'.join(lines) + '\n' if lines else ''
+
+  def format_song(self, pos):
+    song = self.songs[pos]
+    lines = ['file: %s' % song['file']]
+    lines += ['%s: %s' % x for x in song.items() if x[0] != 'file']
+    lines += ['Pos: %d' % pos, 'Id: %d' % (pos + 1)]
+    return '\n'.join(lines) + '\n'
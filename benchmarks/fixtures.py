@@ -0,0 +1,77 @@
+"""
+  Synthetic data for the benchmarks: playlists of any size, the output
+  mpc gives for them and a fake `mpc` executable that prints it.
+
+  The data is made from a fixed seed, so every run of the benchmarks
+  works on the same songs.
+"""
+import random
+import stat
+import os
+
+ARTISTS = ['In Flames', 'Dark Tranquillity', 'Amon Amarth', 'Insomnium',
+           'Omnium Gatherum', 'Soilwork', 'Arch Enemy', 'Children of Bodom',
+           'Wintersun', 'Ensiferum', 'Be\'lakor', 'Mors Principium Est']
+
+WORDS = ['where', 'the', 'dead', 'ships', 'dwell', 'cloud', 'connected',
+         'only', 'for', 'the', 'weak', 'shadows', 'of', 'light', 'winter',
+         'madness', 'stolen', 'waves', 'twilight', 'song', 'fire', 'sea',
+         'lost', 'in', 'time', 'ashes', 'night', 'storm', 'crown', 'iron']
+
+# What `mpc -f MPC_FORMAT status` prints
+STATUS = ('%s\t%s\t\t%s\n'
+          '[playing] #%d/%d   1:02/4:05 (25%%)\n'
+          'volume: 50%%   repeat: off   random: on    single: off   '
+          'consume: off\n')
+
+def make_songs(length, seed=1):
+  """Returns `length` songs, as the tags MPD would give for them"""
+  rand = random.Random(seed)
+  songs = []
+
+  for i in range(length):
+    artist = rand.choice(ARTISTS)
+    title = ' '.join(rand.choice(WORDS)
+                     for _ in range(rand.randint(1, 5))).title()
+    songs.append({
+      'file': '%s/%04d %s.flac' % (artist, i, title),
+      'Artist': artist,
+      'Title': title,
+      'Album': ' '.join(rand.choice(WORDS) for _ in range(2)).title(),
+      'Time': str(rand.randint(120, 480)),
+    })
+
+  return songs
+
+def song_names(songs):
+  """The names of the songs the way mpc shows them in the playlist"""
+  return ['%s - %s' % (x['Artist'], x['Title']) for x in songs]
+
+def mpc_status(songs, current=0):
+  """The output of `mpc` while playing song `current` of `songs`"""
+  song = songs[current]
+  return STATUS % (song['Artist'], song['Title'], song['file'],
+                   current + 1, len(songs))
+
+def write_fake_mpc(directory, songs):
+  """
+    Writes an `mpc` to `directory` that prints the playlist of `songs`
+    for `mpc playlist` and the status for everything else. Put the
+    directory first in PATH to use it
+  """
+  with open(os.path.join(directory, 'playlist'), 'w') as f:
+    f.write(''.join(x + '\n' for x in song_names(songs)))
+
+  with open(os.path.join(directory, 'status'), 'w') as f:
+    f.write(mpc_status(songs))
+
+  path = os.path.join(directory, 'mpc')
+  with open(path, 'w') as f:
+    f.write('#!/bin/sh\n'
+            'case "$1" in\n'
+            '  playlist) exec cat "%s/playlist";;\n'
+            '  *) exec cat "%s/status";;\n'
+            'esac\n' % (directory, directory))
+
+  os.chmod(path, os.stat(path).st_mode | stat.S_IXUSR)
+  return path
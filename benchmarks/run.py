@@ -0,0 +1,434 @@
+#!/usr/bin/python3
+"""
+  Runs the benchmarks of the scripts against fake versions of mpc, MPD
+  and i3, on synthetic playlists and trees of different sizes.
+
+  Each benchmark is run until it has taken `--min-time` seconds and at
+  least `--min-runs` times, after which the throughput and the latency
+  percentiles are reported. The results can be saved as a baseline and
+  later runs compared against it, which fails if any benchmark got
+  slower by more than `--threshold`.
+
+    ./benchmarks/run.py --save baseline.json
+    ./benchmarks/run.py --compare baseline.json
+    ./benchmarks/run.py --sizes 1000 --filter playlist
+"""
+from importlib.machinery import SourceFileLoader
+import importlib.util
+import argparse
+import platform
+import tempfile
+import logging
+import shutil
+import asyncio
+import random
+import json
+import time
+import sys
+import os
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'blocks-scripts'))
+
+import i3ipc
+
+from lib.mpd import Mpc, MpdClient, AsyncMpc, _parse_output, _parse_status
+from lib.scratchpad import get_scratchpad_windows
+from lib.search import SearchIndex
+from lib.library import Library
+
+from fixtures import make_songs, song_names, mpc_status, write_fake_mpc
+from fake_mpd import FakeMpd
+from fake_i3 import FakeI3
+
+SIZES = [1000, 10000, 100000]
+
+# Number of MPD servers the multi room benchmarks use, and how long
+# each of them takes to reply
+SERVERS = 4
+SERVER_DELAY = 0.005
+
+# What is typed into the completion, one character at a time
+TYPED = 'in dead ships'
+
+# Number of songs in the library the index is built from
+LIBRARY_SIZE = 10000
+
+BENCHMARKS = []
+
+def benchmark(name, sized=False, scale=None):
+  """
+    Registers a benchmark. The function is given the Fixtures and the
+    size and returns the function to time, or a tuple of it and a
+    function to run before each run, which is not timed. `scale` turns
+    the playlist size into the size the benchmark uses instead
+  """
+  def register(func):
+    BENCHMARKS.append((name, sized, scale, func))
+    return func
+  return register
+
+def load_script(name):
+  """Imports one of the scripts in the root, which have no .py"""
+  path = os.path.join(ROOT, name)
+  loader = SourceFileLoader(name.replace('-', '_'), path)
+  spec = importlib.util.spec_from_loader(loader.name, loader)
+  module = importlib.util.module_from_spec(spec)
+  loader.exec_module(module)
+  return module
+
+class Fixtures():
+  """
+    The fakes and data the benchmarks share, made when first needed
+    and closed once all are done
+  """
+  def __init__(self):
+    self.directory = tempfile.mkdtemp(prefix='benchmarks-')
+    self.songs = {}
+    self.mpds = {}
+    self.i3s = {}
+    self.scripts = {}
+    self.path = os.environ['PATH']
+
+  def get_songs(self, size):
+    if size not in self.songs:
+      self.songs[size] = make_songs(size)
+    return self.songs[size]
+
+  def get_mpd(self, size):
+    if size not in self.mpds:
+      self.mpds[size] = FakeMpd(self.get_songs(size))
+    return self.mpds[size]
+
+  def get_servers(self, count, delay):
+    """Returns `count` small MPD servers that take `delay` to reply"""
+    for num in range(count):
+      if ('server', num, delay) not in self.mpds:
+        self.mpds['server', num, delay] = FakeMpd(self.get_songs(10), delay)
+    return [self.mpds['server', x, delay] for x in range(count)]
+
+  def use_mpc(self, size):
+    """Puts a fake `mpc` for a playlist of `size` first in PATH"""
+    directory = os.path.join(self.directory, 'mpc-%d' % size)
+    if not os.path.exists(directory):
+      os.mkdir(directory)
+      write_fake_mpc(directory, self.get_songs(size))
+
+    os.environ['PATH'] = directory + os.pathsep + self.path
+
+  def get_i3(self, windows=0):
+    if windows not in self.i3s:
+      self.i3s[windows] = FakeI3(windows=windows, scratchpad_windows=windows)
+    return self.i3s[windows]
+
+  def get_script(self, name, i3):
+    """Returns the script, talking to the fake `i3`"""
+    if name not in self.scripts:
+      os.environ['I3SOCK'] = i3.socket_path
+      self.scripts[name] = load_script(name)
+
+    script = self.scripts[name]
+    script.i3 = i3ipc.Connection(i3.socket_path)
+    return script
+
+  def close(self):
+    for fake in list(self.mpds.values()) + list(self.i3s.values()):
+      fake.close()
+    shutil.rmtree(self.directory, ignore_errors=True)
+    os.environ['PATH'] = self.path
+
+def tree_size(size):
+  """The number of windows in the trees, for a playlist size"""
+  return max(1, size // 100)
+
+# lib.mpd
+
+@benchmark('mpd.parse_output')
+def bench_parse_output(fixtures, size):
+  output = mpc_status(fixtures.get_songs(10))
+  return lambda: _parse_output(output)
+
+@benchmark('mpd.parse_status')
+def bench_parse_status(fixtures, size):
+  mpd = fixtures.get_mpd(10)
+  client = MpdClient(mpd.socket_path)
+  status = dict(client.command('status'))
+  song = dict(client.command('currentsong'))
+  client.disconnect()
+  return lambda: _parse_status(status, song)
+
+@benchmark('mpd.get_playlist.full', sized=True)
+def bench_playlist_full(fixtures, size):
+  mpc = Mpc(MpdClient(fixtures.get_mpd(size).socket_path))
+
+  def forget():
+    mpc.playlist_version = None
+
+  return mpc.get_playlist, forget
+
+@benchmark('mpd.get_playlist.cached', sized=True)
+def bench_playlist_cached(fixtures, size):
+  mpc = Mpc(MpdClient(fixtures.get_mpd(size).socket_path))
+  mpc.get_playlist()
+  return mpc.get_playlist
+
+@benchmark('mpd.get_playlist.changed', sized=True)
+def bench_playlist_changed(fixtures, size):
+  mpd = fixtures.get_mpd(size)
+  songs = fixtures.get_songs(size)
+  mpc = Mpc(MpdClient(mpd.socket_path))
+  mpc.get_playlist()
+  rand = random.Random(size)
+
+  def change():
+    mpd.change_song(rand.randrange(size), rand.choice(songs))
+
+  return mpc.get_playlist, change
+
+@benchmark('mpd.iter_playlist', sized=True)
+def bench_iter_playlist(fixtures, size):
+  mpc = Mpc(MpdClient(fixtures.get_mpd(size).socket_path))
+
+  def run():
+    for _ in mpc.iter_playlist():
+      pass
+
+  return run
+
+@benchmark('mpd.get_playlist.mpc', sized=True)
+def bench_playlist_mpc(fixtures, size):
+  # No MPD to connect to, so it falls back to running the fake mpc
+  fixtures.use_mpc(size)
+  mpc = Mpc(MpdClient(os.path.join(fixtures.directory, 'no-mpd.sock')))
+  return mpc.get_playlist
+
+@benchmark('mpd.multi.update')
+def bench_multi_update(fixtures, size):
+  # The servers are asked at the same time, so this should take
+  # about as long as one of them
+  servers = fixtures.get_servers(SERVERS, SERVER_DELAY)
+  mpc = AsyncMpc({x: mpd.socket_path for x, mpd in enumerate(servers)})
+  loop = asyncio.new_event_loop()
+  return lambda: loop.run_until_complete(mpc.update())
+
+@benchmark('mpd.multi.pause')
+def bench_multi_pause(fixtures, size):
+  servers = fixtures.get_servers(SERVERS, SERVER_DELAY)
+  mpc = AsyncMpc({x: mpd.socket_path for x, mpd in enumerate(servers)})
+  loop = asyncio.new_event_loop()
+  return lambda: loop.run_until_complete(mpc.pause())
+
+# lib.search, which the completion filters with
+
+@benchmark('completion.build', sized=True)
+def bench_completion_build(fixtures, size):
+  names = song_names(fixtures.get_songs(size))
+  return lambda: SearchIndex(names)
+
+@benchmark('completion.typing', sized=True)
+def bench_completion_typing(fixtures, size):
+  index = SearchIndex(song_names(fixtures.get_songs(size)))
+  queries = [TYPED[:x] for x in range(1, len(TYPED) + 1)]
+
+  def run():
+    for query in queries:
+      index.filter(query)
+
+  def clear():
+    index.filter('')
+
+  return run, clear
+
+# lib.library, which searches the whole library
+
+@benchmark('library.build')
+def bench_library_build(fixtures, size):
+  client = MpdClient(fixtures.get_mpd(LIBRARY_SIZE).socket_path)
+  path = os.path.join(fixtures.directory, 'library.sqlite')
+
+  def forget():
+    if os.path.exists(path):
+      os.unlink(path)
+
+  return lambda: Library(path).refresh(client), forget
+
+@benchmark('library.refresh', sized=True)
+def bench_library_refresh(fixtures, size):
+  mpd = fixtures.get_mpd(size)
+  songs = fixtures.get_songs(size)
+  client = MpdClient(mpd.socket_path)
+  path = os.path.join(fixtures.directory, 'library-%d.sqlite' % size)
+  library = Library(path)
+  library.refresh(client)
+  rand = random.Random(size)
+
+  def change():
+    library_songs = list(songs)
+    library_songs[rand.randrange(size)] = rand.choice(songs)
+    mpd.update_library(library_songs)
+
+  return lambda: library.refresh(client), change
+
+@benchmark('library.search', sized=True)
+def bench_library_search(fixtures, size):
+  library = Library(':memory:')
+  library.refresh(MpdClient(fixtures.get_mpd(size).socket_path))
+  queries = [TYPED[:x] for x in range(1, len(TYPED) + 1)]
+
+  def run():
+    for query in queries:
+      library.search(query)
+
+  return run
+
+# i3
+
+@benchmark('i3.scratchpad_windows', sized=True, scale=tree_size)
+def bench_scratchpad_windows(fixtures, size):
+  i3 = i3ipc.Connection(fixtures.get_i3(size).socket_path)
+  return lambda: get_scratchpad_windows(i3.get_tree())
+
+@benchmark('grabber.make_entry', sized=True, scale=tree_size)
+def bench_make_entry(fixtures, size):
+  grabber = fixtures.get_script('rofi-scratchpad-grabber',
+                                fixtures.get_i3(size))
+  windows, longest_name, longest_class = grabber.get_scratchpad_windows()
+
+  def run():
+    for window in windows:
+      grabber.make_entry(window, longest_name, longest_class)
+
+  return run
+
+@benchmark('grabber.pad_name')
+def bench_pad_name(fixtures, size):
+  grabber = fixtures.get_script('rofi-scratchpad-grabber', fixtures.get_i3())
+  return lambda: grabber.pad_name('Termite', 40, 60)
+
+@benchmark('switcher.switch_workspace', sized=True, scale=tree_size)
+def bench_switch_workspace(fixtures, size):
+  i3 = fixtures.get_i3(size)
+  switcher = fixtures.get_script('xmonad-workspace-switcher', i3)
+
+  # Swaps workspace 2 over from the other output every time
+  return lambda: switcher.switch_workspace(2), i3.reset
+
+def measure(run, prepare=None, min_time=0.5, min_runs=5, max_runs=100000):
+  """
+    Returns the time of each run, running it until the limits are met.
+    The first run only warms up the caches and is not counted
+  """
+  if prepare is not None:
+    prepare()
+  run()
+
+  timings = []
+  total = 0
+
+  while (total < min_time or len(timings) < min_runs) and \
+        len(timings) < max_runs:
+    if prepare is not None:
+      prepare()
+
+    start = time.perf_counter()
+    run()
+    timings.append(time.perf_counter() - start)
+    total += timings[-1]
+
+  return timings
+
+def percentile(timings, percent):
+  timings = sorted(timings)
+  index = int(round(percent / 100 * (len(timings) - 1)))
+  return timings[min(len(timings) - 1, index)]
+
+def summarize(timings):
+  return {
+    'runs': len(timings),
+    'ops': len(timings) / sum(timings) if sum(timings) > 0 else 0,
+    'p50': percentile(timings, 50),
+    'p90': percentile(timings, 90),
+    'p99': percentile(timings, 99),
+    'max': max(timings),
+  }
+
+def format_time(seconds):
+  if seconds >= 1:
+    return '%7.2fs ' % seconds
+  if seconds >= 0.001:
+    return '%7.2fms' % (seconds * 1000)
+  return '%7.2fus' % (seconds * 1000000)
+
+def format_result(name, result, baseline=None):
+  line = '%-38s %9.1f/s  p50 %s  p90 %s  p99 %s' % (
+    name, result['ops'], format_time(result['p50']),
+    format_time(result['p90']), format_time(result['p99']))
+
+  if baseline is not None:
+    line += '  %+6.1f%%' % ((result['p50'] / baseline['p50'] - 1) * 100)
+
+  return line
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+  parser.add_argument('--sizes', default=','.join(str(x) for x in SIZES),
+                      help='playlist sizes, separated by commas')
+  parser.add_argument('--filter', default='',
+                      help='only run the benchmarks with this in the name')
+  parser.add_argument('--min-time', type=float, default=0.5)
+  parser.add_argument('--min-runs', type=int, default=5)
+  parser.add_argument('--save', metavar='PATH',
+                      help='save the results as a baseline')
+  parser.add_argument('--compare', metavar='PATH',
+                      help='compare the results with a saved baseline')
+  parser.add_argument('--threshold', type=float, default=0.25,
+                      help='how much slower the p50 may get (default 0.25)')
+  args = parser.parse_args()
+
+  sizes = [int(x) for x in args.sizes.split(',') if x]
+  baseline = {}
+  if args.compare:
+    with open(args.compare) as f:
+      baseline = json.load(f)['results']
+
+  logging.disable(logging.CRITICAL)
+  fixtures = Fixtures()
+  results = {}
+  regressions = []
+
+  try:
+    for name, sized, scale, func in BENCHMARKS:
+      for size in (sizes if sized else [None]):
+        if size is not None and scale is not None:
+          size = scale(size)
+
+        full_name = name if size is None else '%s[%d]' % (name, size)
+        if args.filter not in full_name:
+          continue
+
+        bench = func(fixtures, size)
+        run, prepare = bench if isinstance(bench, tuple) else (bench, None)
+        result = summarize(measure(run, prepare, args.min_time, args.min_runs))
+        results[full_name] = result
+
+        base = baseline.get(full_name)
+        print(format_result(full_name, result, base), flush=True)
+
+        if base is not None and \
+           result['p50'] > base['p50'] * (1 + args.threshold):
+          regressions.append(full_name)
+  finally:
+    fixtures.close()
+
+  if args.save:
+    with open(args.save, 'w') as f:
+      json.dump({'python': platform.python_version(),
+                 'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+                 'results': results}, f, indent=2, sort_keys=True)
+
+  if regressions:
+    print('\nSlower than the baseline: %s' % ', '.join(regressions))
+    sys.exit(1)
+
+if __name__ == '__main__':
+  main()
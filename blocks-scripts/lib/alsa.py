@@ -0,0 +1,240 @@
+"""
+  A minimal wrapper around the simple mixer of libasound, which is what
+  amixer uses. The mixer is kept open, so reading or changing a volume
+  does not start a process, and its poll descriptors can be given to an
+  event loop to hear when anything changed a control, be it a media key,
+  another program or us. There is no ALSA module in the standard
+  library, so this uses ctypes. `Mixer` raises OSError if libasound is
+  not available or the card can not be opened.
+"""
+import ctypes
+import ctypes.util
+import os
+
+# SND_MIXER_SCHN_FRONT_LEFT, the channel amixer shows first
+CHANNEL = 0
+
+class PollFd(ctypes.Structure):
+  _fields_ = [('fd', ctypes.c_int),
+              ('events', ctypes.c_short),
+              ('revents', ctypes.c_short)]
+
+def percent_of(value, low, high):
+  """Returns `value` in the range as percent, rounded like amixer"""
+  if high <= low:
+    return 0
+  return int(round((value - low) * 100 / (high - low)))
+
+def value_of(percent, low, high):
+  """Returns the value in the range for `percent`"""
+  return low + int(round(percent * (high - low) / 100))
+
+def load_library():
+  name = ctypes.util.find_library('asound')
+  if name is None:
+    raise OSError('libasound is not available')
+
+  lib = ctypes.CDLL(name)
+  lib.snd_strerror.restype = ctypes.c_char_p
+  lib.snd_mixer_find_selem.restype = ctypes.c_void_p
+  lib.snd_mixer_find_selem.argtypes = [ctypes.c_void_p, ctypes.c_void_p]
+
+  for kind in ('playback', 'capture'):
+    for func in ('has_%s_volume', 'has_%s_switch'):
+      getattr(lib, 'snd_mixer_selem_' + func % kind).argtypes = \
+          [ctypes.c_void_p]
+    getattr(lib, 'snd_mixer_selem_get_%s_volume_range' % kind).argtypes = \
+        [ctypes.c_void_p, ctypes.POINTER(ctypes.c_long),
+         ctypes.POINTER(ctypes.c_long)]
+    getattr(lib, 'snd_mixer_selem_get_%s_volume' % kind).argtypes = \
+        [ctypes.c_void_p, ctypes.c_int, ctypes.POINTER(ctypes.c_long)]
+    getattr(lib, 'snd_mixer_selem_set_%s_volume_all' % kind).argtypes = \
+        [ctypes.c_void_p, ctypes.c_long]
+    getattr(lib, 'snd_mixer_selem_get_%s_switch' % kind).argtypes = \
+        [ctypes.c_void_p, ctypes.c_int, ctypes.POINTER(ctypes.c_int)]
+    getattr(lib, 'snd_mixer_selem_set_%s_switch_all' % kind).argtypes = \
+        [ctypes.c_void_p, ctypes.c_int]
+
+  return lib
+
+class MixerElement():
+  """
+    A control of the mixer, such as Master or Capture. Uses the playback
+    volume if it has one, the capture volume otherwise. The values are
+    the ones libasound last heard of, so `Mixer.handle_events` has to be
+    called when the mixer is readable for them to be up to date
+  """
+  def __init__(self, lib, elem, name):
+    self.lib = lib
+    self.elem = elem
+    self.name = name
+
+    kind = 'playback'
+    if not lib.snd_mixer_selem_has_playback_volume(elem):
+      if not lib.snd_mixer_selem_has_capture_volume(elem):
+        raise OSError('%s has no volume' % name)
+      kind = 'capture'
+
+    self.get_volume = getattr(lib, 'snd_mixer_selem_get_%s_volume' % kind)
+    self.set_volume = getattr(lib, 'snd_mixer_selem_set_%s_volume_all' % kind)
+    self.get_switch = getattr(lib, 'snd_mixer_selem_get_%s_switch' % kind)
+    self.set_switch = getattr(lib, 'snd_mixer_selem_set_%s_switch_all' % kind)
+    self.has_switch = getattr(lib,
+                              'snd_mixer_selem_has_%s_switch' % kind)(elem)
+
+    low, high = ctypes.c_long(), ctypes.c_long()
+    getattr(lib, 'snd_mixer_selem_get_%s_volume_range' % kind)(
+        elem, ctypes.byref(low), ctypes.byref(high))
+    self.low, self.high = low.value, high.value
+
+  def value(self):
+    value = ctypes.c_long()
+    self.get_volume(self.elem, CHANNEL, ctypes.byref(value))
+    return value.value
+
+  def read(self):
+    """Returns the volume in percent and whether it is on (not muted)"""
+    on = ctypes.c_int(1)
+    if self.has_switch:
+      self.get_switch(self.elem, CHANNEL, ctypes.byref(on))
+
+    return percent_of(self.value(), self.low, self.high), bool(on.value)
+
+  def change(self, step):
+    """
+      Changes the volume by `step` percent, which can be negative,
+      and returns the new state like `read`
+    """
+    current = self.value()
+    percent = percent_of(current, self.low, self.high) + step
+    value = value_of(max(0, min(100, percent)), self.low, self.high)
+
+    # With only a few steps in the range, a small step could round
+    # to the same value, so move at least one step
+    if value == current and step != 0:
+      value = max(self.low, min(self.high, current + (1 if step > 0 else -1)))
+
+    self.set_volume(self.elem, value)
+    return self.read()
+
+  def toggle(self):
+    """Mutes or unmutes, returning the new state like `read`"""
+    if self.has_switch:
+      _, on = self.read()
+      self.set_switch(self.elem, 0 if on else 1)
+    return self.read()
+
+class Mixer():
+  """
+    The mixer of a card, `default` being the one amixer uses when not
+    given one. Use `element` to get a control and `watch` to be called
+    from an asyncio loop when any of the controls change.
+
+    If the card goes away (unplugged, or pulse stopped for the pulse
+    plugin), the mixer stops being watched, the `lost` callbacks given
+    to `watch` are called with it and it is closed. It can not be used
+    after that, a new one has to be opened.
+  """
+  def __init__(self, card='default'):
+    try:
+      self.lib = load_library()
+    except (OSError, AttributeError) as e:
+      raise OSError('libasound is not available: %s' % e)
+
+    handle = ctypes.c_void_p()
+    self.check(self.lib.snd_mixer_open(ctypes.byref(handle), 0))
+    self.handle = handle
+    self.elements = {}
+    self.callbacks = []
+    self.lost_callbacks = []
+    self.loop = None
+    self.watched = []
+
+    try:
+      self.check(self.lib.snd_mixer_attach(handle, os.fsencode(card)))
+      self.check(self.lib.snd_mixer_selem_register(handle, None, None))
+      self.check(self.lib.snd_mixer_load(handle))
+    except OSError:
+      self.close()
+      raise
+
+  def check(self, result):
+    """Raises OSError if `result` of a call into libasound is an error"""
+    if result < 0:
+      raise OSError(-result, self.lib.snd_strerror(result).decode('utf-8'))
+    return result
+
+  def element(self, name, index=0):
+    """Returns the control `name`, raising OSError if there is none"""
+    if (name, index) in self.elements:
+      return self.elements[name, index]
+
+    selem_id = ctypes.c_void_p()
+    self.check(self.lib.snd_mixer_selem_id_malloc(ctypes.byref(selem_id)))
+    try:
+      self.lib.snd_mixer_selem_id_set_name(selem_id, name.encode('utf-8'))
+      self.lib.snd_mixer_selem_id_set_index(selem_id, index)
+      elem = self.lib.snd_mixer_find_selem(self.handle, selem_id)
+    finally:
+      self.lib.snd_mixer_selem_id_free(selem_id)
+
+    if not elem:
+      raise OSError('no mixer control named %s' % name)
+
+    self.elements[name, index] = MixerElement(self.lib, elem, name)
+    return self.elements[name, index]
+
+  def fds(self):
+    """Returns the file descriptors that are readable on changes"""
+    count = self.check(self.lib.snd_mixer_poll_descriptors_count(self.handle))
+    pollfds = (PollFd * count)()
+    count = self.check(self.lib.snd_mixer_poll_descriptors(self.handle,
+                                                           pollfds, count))
+    return [x.fd for x in pollfds[:count]]
+
+  def handle_events(self):
+    """Reads the pending changes, updating the values of the controls"""
+    self.check(self.lib.snd_mixer_handle_events(self.handle))
+
+  def watch(self, loop, callback, lost=None):
+    """
+      Calls `callback` in `loop` whenever a control has changed, and
+      `lost` with the mixer if it stops working
+    """
+    if not self.callbacks:
+      self.loop = loop
+      self.watched = self.fds()
+      for fd in self.watched:
+        loop.add_reader(fd, self.on_event)
+
+    self.callbacks.append(callback)
+    if lost is not None:
+      self.lost_callbacks.append(lost)
+
+  def unwatch(self):
+    """Stops watching the mixer and calling the callbacks"""
+    # The descriptors watched are removed, as asking libasound
+    # for them again fails once the card has gone away
+    for fd in self.watched:
+      self.loop.remove_reader(fd)
+    self.watched = []
+    self.callbacks = []
+
+  def on_event(self):
+    try:
+      self.handle_events()
+    except OSError:
+      # The descriptors stay readable, so keeping them in the loop
+      # would have it calling this over and over
+      lost, self.lost_callbacks = self.lost_callbacks, []
+      self.unwatch()
+      self.close()
+      for callback in lost:
+        callback(self)
+      return
+
+    for callback in self.callbacks:
+      callback()
+
+  def close(self):
+    self.lib.snd_mixer_close(self.handle)
@@ -1,7 +1,21 @@
 import gi
+import threading
+import logging
 
 from gi.repository import Gtk
 from gi.repository import Gdk
+from gi.repository import GLib
+
+from lib.search import SearchIndex
+from lib.metrics import timer
+
+log = logging.getLogger(__name__)
+
+# Seconds to wait for more keypresses before filtering
+FILTER_DELAY = 0.05
+
+# Number of rows added to the view at a time
+MODEL_BATCH = 200
 
 class Completion():
   """
@@ -29,8 +43,16 @@ class Completion():
     `in`, `dead` and `ships` are in it. (Doesnt care about case)
 
     Simple, but useful. Will never be larger than the window itself.
+
+    The filtering is done in a background thread so typing is never held
+    up by it. Keypresses that come in quick succession are filtered once,
+    and a filter made outdated by a new keypress is cancelled.
+
+    Only the rows that can be seen are put into the view to begin with,
+    more are added in batches as the user scrolls down. The number of
+    matches shown can be capped with `limit`.
     """
-  def __init__(self, window, entry):
+  def __init__(self, window, entry, limit=None):
     self.entry = entry
     self.entry_window = window
 
@@ -51,6 +73,7 @@ class Completion():
     self.scroll = Gtk.ScrolledWindow()
     self.scroll.set_min_content_height(0)
     self.scroll.set_max_content_width(200)
+    self.scroll.get_vadjustment().connect('value-changed', self.on_scroll)
     self.frame.add(self.scroll)
 
     # The tree view itself that can hold a list of strings
@@ -64,6 +87,19 @@ class Completion():
 
     self.selected = 0
     self.elements = []
+    self.rows = []
+    self.limit = limit
+    self.elements_model = None
+    self.index = SearchIndex()
+
+    # The worker thread filters the latest `query`. Each change to the
+    # query bumps `generation` which cancels any filter on older ones
+    self.query = None
+    self.generation = 0
+    self.condition = threading.Condition()
+    self.worker = threading.Thread(target=self.filter_worker)
+    self.worker.daemon = True
+    self.worker.start()
     self.previous_height = 0
     self.selection = self.view.get_selection()
     self.is_hidden = True
@@ -93,6 +129,11 @@ class Completion():
     length = self.model.iter_n_children()
     returnVal = False
 
+    # Add more rows before moving past the last one that is loaded
+    if self.selected + 1 >= length and length < len(self.rows):
+      self.fill_model(length + MODEL_BATCH)
+      length = self.model.iter_n_children()
+
     # Go above max length === go back to 0
     # Go below 0 and you are back to the entry box
     if event.keyval == Gdk.KEY_Down or event.keyval == Gdk.KEY_KP_Down:
@@ -129,27 +170,111 @@ class Completion():
       This function is called whenever the user writes text into the entry
       field, which should make us readjust our view based on the text.
       This does this by updating the model and therefore updating the
-      view that is shown in the completion menu
-    """
-    text = widget.get_text().lower()
-    split = text.split()
-    matches = [element
-               for element in self.elements
-               if len(split) == len([x for x in split if x in element.lower()])]
-    self.update_model(matches)
-    self.update_height()
-    self.selection.unselect_all()
-    self.selection.select_path(Gtk.TreePath.new_first())
+      view that is shown in the completion menu.
+
+      The filtering itself is handed to the worker thread, which
+      calls `on_filtered` when it is done
+    """
+    with self.condition:
+      self.generation += 1
+      self.query = widget.get_text()
+      self.condition.notify()
+
+  def filter_worker(self):
+    """
+      Runs in a thread of its own, filtering the latest query once
+      no new one has come in for `FILTER_DELAY` seconds
+    """
+    while True:
+      with self.condition:
+        while self.query is None:
+          self.condition.wait()
+
+        # Wait for the user to stop typing
+        generation = None
+        while generation != self.generation:
+          generation = self.generation
+          self.condition.wait(FILTER_DELAY)
+
+        text, self.query = self.query, None
+
+      # A query that can not be filtered should not take down
+      # the thread, which would stop filtering for good
+      try:
+        with timer('completion.filter'):
+          matches = self.index.filter(
+              text, lambda: generation != self.generation)
+      except Exception:
+        log.exception('Unable to filter the completion for %r', text)
+        continue
+
+      if matches is not None:
+        GLib.idle_add(self.on_filtered, generation, matches)
+
+  def on_filtered(self, generation, matches):
+    """
+      Called on the main thread with the result of filtering. The
+      result is thrown away if the text changed in the meantime
+    """
+    if generation == self.generation:
+      self.update_model(matches)
+      self.update_height()
+      self.selection.unselect_all()
+      self.selection.select_path(Gtk.TreePath.new_first())
+
+    return False
 
   def update_list(self, elements):
-    """Sets a new list of strings to use as completion"""
+    """
+      Sets a new list of strings to use as completion, indexing
+      them so they can be filtered quickly while typing
+    """
     self.elements = elements
+    self.elements_model = None
+
+    # Cancel any running filter as it is about to be outdated
+    with self.condition:
+      self.generation += 1
+    self.index.update(elements)
     self.update_model(elements)
 
   def update_model(self, elements):
-    """ Updates the model by appending the list of elements given"""
-    self.model.clear()
-    [self.model.append([x]) for x in elements]
+    """
+      Shows the list of elements given in the view. Rather than clearing
+      and appending to the model the view has, which makes the view
+      update itself for every row, a new model is filled with the first
+      rows while it is detached and then swapped in.
+
+      Matching everything is common (the entry is empty), so the model
+      for all the elements is kept around and reused.
+    """
+    matches_all = len(elements) == len(self.elements)
+
+    if matches_all and self.elements_model is not None:
+      model = self.elements_model
+    else:
+      model = Gtk.ListStore(str)
+      if matches_all:
+        self.elements_model = model
+
+    self.rows = elements if self.limit is None else elements[:self.limit]
+    self.model = model
+    self.fill_model(MODEL_BATCH)
+    self.view.set_model(model)
+
+  def fill_model(self, length):
+    """Adds rows to the model until it has `length` rows or no more rows"""
+    loaded = self.model.iter_n_children()
+
+    for row in self.rows[loaded:length]:
+      self.model.insert_with_valuesv(-1, [0], [row])
+
+  def on_scroll(self, adjustment):
+    """Adds more rows to the model when the user gets close to the end"""
+    bottom = adjustment.get_value() + adjustment.get_page_size()
+
+    if adjustment.get_upper() - bottom < adjustment.get_page_size():
+      self.fill_model(self.model.iter_n_children() + MODEL_BATCH)
 
   def update_height(self):
     """
@@ -163,7 +288,7 @@ class Completion():
 
       It can therefore be shorter, if there are few elements in the model
     """
-    length = self.model.iter_n_children()
+    length = len(self.rows)
 
     rect = self.column.cell_get_size()
     height = rect.height * length
@@ -0,0 +1,256 @@
+"""
+  This module implements the i3bar protocol, so a single long running
+  process can feed i3bar with all the blocks instead of i3blocks
+  running a script for each of them.
+
+  Every block is a Block, which has its own interval (or none, if it is
+  only updated when clicked, signalled or by events of its own) and all
+  of them share one asyncio event loop run by the Bar. Click events
+  from i3bar are read from stdin and given to the block that was
+  clicked.
+
+  The blocks take the same properties as in the i3blocks config
+  (`label`, `align`, `min_width`, `markup` etc.) so the output looks
+  the same as before.
+"""
+import asyncio
+import signal
+import json
+import sys
+import os
+
+from lib.metrics import timer, count
+
+class Block():
+  """
+    Base class for a block on the bar. Subclasses override `update`,
+    which returns the text to show, and `on_click` if they react to
+    clicks. The text can be a string (pango if `markup=pango`) or a
+    dictionary with the i3bar fields, such as `full_text` and
+    `background`. An empty `full_text` hides the block, like in i3blocks.
+
+    `interval` is the number of seconds between each update. Without it
+    the block is only updated at the start and when clicked or signalled
+    with SIGRTMIN+`signal`. Blocks that get updates from elsewhere can
+    override `start` to hook into the event loop of the bar.
+  """
+  interval = None
+
+  def __init__(self, name, label='', instance=None, interval=None,
+               signal=None, **properties):
+    self.name = name
+    self.label = label
+    self.instance = instance
+    self.signal = signal
+    self.properties = properties
+    self.output = None
+    self.bar = None
+    self.metric = 'block.' + name
+
+    if interval is not None:
+      self.interval = interval
+
+  def start(self, bar):
+    """Called once the bar is running, before the first update"""
+    self.bar = bar
+
+  def update(self):
+    """Returns the text that the block should show"""
+    return ''
+
+  def on_click(self, event):
+    """
+      Called with the click event from i3bar. Returns the text to show,
+      or None to update the block like normal
+    """
+    return None
+
+  def refresh(self, event=None):
+    """Updates the block, `event` being the click event if clicked"""
+    with timer(self.metric):
+      text = self.on_click(event) if event is not None else None
+      if text is None:
+        text = self.update()
+
+    self.set_output(text)
+
+  def set_output(self, text):
+    """
+      Sets what the block shows, telling the bar to redraw if it changed
+    """
+    output = dict(text) if isinstance(text, dict) else {'full_text': text}
+
+    if output.get('full_text'):
+      output['full_text'] = self.label + output['full_text']
+      output['name'] = self.name
+      if self.instance is not None:
+        output['instance'] = self.instance
+      for key, value in self.properties.items():
+        output.setdefault(key, value)
+    else:
+      output = None
+
+    if output != self.output:
+      self.output = output
+      if self.bar is not None:
+        self.bar.changed()
+
+class ScriptBlock(Block):
+  """
+    A block that runs an i3blocks script, the same way i3blocks would.
+    The script is given the `BLOCK_*` environment variables and its
+    first line of output is shown. With `format='json'`, the output
+    is read as an i3bar JSON object instead.
+
+    Running the script does not hold up the rest of the bar.
+  """
+  def __init__(self, name, command, format=None, **properties):
+    Block.__init__(self, name, **properties)
+    self.command = command
+    self.format = format
+    self.running = None
+
+  def refresh(self, event=None):
+    """Runs the script in the background, setting the output when done"""
+    # A click has to be handled, while a timed update can be skipped
+    # if the script is still running
+    if self.running is not None and not self.running.done():
+      if event is None:
+        count(self.metric + '.skipped')
+        return
+      self.running.cancel()
+
+    self.running = asyncio.ensure_future(self.run(event))
+
+  async def run(self, event):
+    env = dict(os.environ)
+    env['BLOCK_NAME'] = self.name
+    env['BLOCK_INSTANCE'] = self.instance or ''
+    env['BLOCK_BUTTON'] = ''
+
+    if event is not None:
+      env['BLOCK_BUTTON'] = str(event.get('button', ''))
+      env['BLOCK_X'] = str(event.get('x', ''))
+      env['BLOCK_Y'] = str(event.get('y', ''))
+
+    with timer(self.metric):
+      process = await asyncio.create_subprocess_exec(
+          *self.command,
+          env=env,
+          stdin=asyncio.subprocess.DEVNULL,
+          stdout=asyncio.subprocess.PIPE,
+          stderr=asyncio.subprocess.DEVNULL)
+      try:
+        output, _ = await process.communicate()
+      except asyncio.CancelledError:
+        process.kill()
+        raise
+
+    lines = output.decode('utf-8', 'replace').split('\n')
+
+    if self.format == 'json':
+      self.set_output(json.loads(lines[0]) if lines[0].strip() else '')
+    else:
+      self.set_output(lines[0])
+
+class Bar():
+  """
+    Runs the event loop that updates the `blocks`, writing them
+    to i3bar with the i3bar protocol when any of them change.
+  """
+  def __init__(self, blocks, loop=None, output=sys.stdout, input=sys.stdin):
+    self.blocks = blocks
+    self.loop = loop or asyncio.get_event_loop()
+    self.output = output
+    self.input = input
+    self.buffer = b''
+    self.write_pending = False
+
+  def changed(self):
+    """
+      Tells the bar that a block has changed. The bar is written
+      once the current round of updates is done
+    """
+    if not self.write_pending:
+      self.write_pending = True
+      self.loop.call_soon(self.write)
+
+  def refresh_threadsafe(self, block):
+    """Updates `block` from a different thread than the event loop"""
+    self.loop.call_soon_threadsafe(block.refresh)
+
+  def write(self):
+    """Writes all the visible blocks to i3bar as a single line"""
+    self.write_pending = False
+    outputs = [x.output for x in self.blocks if x.output is not None]
+    self.output.write(',' + json.dumps(outputs) + '\n')
+    self.output.flush()
+
+  def schedule(self, block):
+    """Updates `block` and schedules its next update"""
+    block.refresh()
+    self.loop.call_later(block.interval, self.schedule, block)
+
+  def on_signal(self, num):
+    """Updates the blocks that are bound to SIGRTMIN+`num`"""
+    for block in self.blocks:
+      if block.signal == num:
+        block.refresh()
+
+  def on_input(self):
+    """
+      Reads the click events i3bar sends, which is an endless JSON array
+      with an object on each line
+    """
+    data = os.read(self.input.fileno(), 4096)
+
+    if not data:
+      self.loop.remove_reader(self.input.fileno())
+      return
+
+    lines = (self.buffer + data).split(b'\n')
+    self.buffer = lines.pop()
+
+    for line in lines:
+      line = line.decode('utf-8', 'replace').strip().lstrip('[,')
+      if not line:
+        continue
+
+      # A line that is cut off or garbled is skipped, so one bad
+      # line does not stop the clicks after it from being read
+      try:
+        event = json.loads(line)
+      except ValueError:
+        count('bar.bad_click')
+        continue
+
+      if isinstance(event, dict):
+        self.on_click(event)
+
+  def on_click(self, event):
+    """Gives the click event to the block that was clicked"""
+    for block in self.blocks:
+      if block.name == event.get('name') and \
+         block.instance == event.get('instance'):
+        block.refresh(event)
+
+  def run(self):
+    """Starts updating the blocks, running until killed"""
+    self.output.write(json.dumps({'version': 1, 'click_events': True}))
+    self.output.write('\n[\n[]\n')
+    self.output.flush()
+
+    self.loop.add_reader(self.input.fileno(), self.on_input)
+
+    signals = set(x.signal for x in self.blocks if x.signal is not None)
+    for num in signals:
+      self.loop.add_signal_handler(signal.SIGRTMIN + num, self.on_signal, num)
+
+    for block in self.blocks:
+      block.start(self)
+      if block.interval is None:
+        block.refresh()
+      else:
+        self.schedule(block)
+
+    self.loop.run_forever()
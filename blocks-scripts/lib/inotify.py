@@ -0,0 +1,58 @@
+"""
+  A minimal wrapper around the inotify calls in libc, so a block can
+  wake up when a file changes instead of checking it on a timer.
+  There is no inotify module in the standard library, so this uses
+  ctypes. `Inotify` raises OSError if inotify is not available.
+"""
+import ctypes
+import ctypes.util
+import os
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+
+IN_CLOEXEC = 0o2000000
+IN_NONBLOCK = 0o4000
+
+class Inotify():
+  """
+    An inotify instance. Use `add_watch` to watch paths and give `fd`
+    to an event loop, calling `read` when it is readable.
+  """
+  def __init__(self):
+    try:
+      self.libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+      self.fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+    except (OSError, AttributeError) as e:
+      raise OSError('inotify is not available: %s' % e)
+
+    if self.fd < 0:
+      errno = ctypes.get_errno()
+      raise OSError(errno, os.strerror(errno))
+
+  def add_watch(self, path, mask):
+    """Watches `path` for the events in `mask`"""
+    wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+    if wd < 0:
+      errno = ctypes.get_errno()
+      raise OSError(errno, os.strerror(errno), path)
+    return wd
+
+  def read(self):
+    """
+      Reads and throws away the pending events. The events are only used
+      as a reason to look at the files again, so their content is not needed
+    """
+    try:
+      while os.read(self.fd, 4096):
+        pass
+    except BlockingIOError:
+      pass
+
+  def close(self):
+    os.close(self.fd)
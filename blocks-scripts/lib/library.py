@@ -0,0 +1,261 @@
+"""
+  A search index over the whole MPD library, kept on disk with SQLite so
+  the song picker can search every song without getting the listing of
+  the library (hundreds of thousands of songs) every time it opens.
+
+  The index remembers the `db_update` time MPD gave in `stats` and
+  `refresh` does nothing while it stays the same, which costs a single
+  command. When MPD updated its database, only the songs modified since
+  are fetched (`find modified-since`). If the index then has more songs
+  than MPD, some were removed and the list of files is fetched to find
+  them. The whole library is only fetched when building the index, or
+  when it somehow ended up with a different number of songs than MPD.
+  Without `db_update` (MPD versions or proxies that leave it out of
+  `stats`), the songs modified since the last refresh are fetched
+  instead, as there is no telling whether the database changed.
+  `refresh` can be called when the picker opens, or when `Mpc` reports
+  a change in the `database` subsystem.
+
+  A song matches when every word of the query starts a word of its name
+  (`Artist - Title`) or album, ignoring case and accents, so
+  `in dead sh` matches `In Flames - Where the Dead Ships Dwell`. This
+  uses FTS5, without which sqlite3.OperationalError is raised.
+
+  The songs found can be added to the queue in one go with `Mpc.add`:
+
+    library = Library()
+    library.refresh(mpc.client)
+    mpc.add([x['file'] for x in library.search('in dead sh')])
+"""
+import logging
+import sqlite3
+import time
+import os
+
+from lib.mpd import MpdError, song_name
+
+LIBRARY_PATH = os.path.join(
+    os.environ.get('XDG_CACHE_HOME', os.path.expanduser('~/.cache')),
+    'blocks-scripts', 'mpd-library.sqlite')
+
+log = logging.getLogger(__name__)
+
+# Bumped when the tables change, which rebuilds the index
+SCHEMA_VERSION = 1
+
+SEARCH_LIMIT = 200
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+  key TEXT PRIMARY KEY,
+  value TEXT
+);
+
+CREATE TABLE IF NOT EXISTS songs (
+  id INTEGER PRIMARY KEY,
+  file TEXT UNIQUE NOT NULL,
+  modified TEXT,
+  name TEXT,
+  album TEXT
+);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS songs_fts USING fts5(
+  name, album,
+  content='songs', content_rowid='id',
+  prefix='1 2 3', tokenize='unicode61 remove_diacritics 2'
+);
+
+CREATE TRIGGER IF NOT EXISTS songs_insert AFTER INSERT ON songs BEGIN
+  INSERT INTO songs_fts(rowid, name, album)
+  VALUES (new.id, new.name, new.album);
+END;
+
+CREATE TRIGGER IF NOT EXISTS songs_delete AFTER DELETE ON songs BEGIN
+  INSERT INTO songs_fts(songs_fts, rowid, name, album)
+  VALUES ('delete', old.id, old.name, old.album);
+END;
+
+CREATE TRIGGER IF NOT EXISTS songs_update AFTER UPDATE ON songs BEGIN
+  INSERT INTO songs_fts(songs_fts, rowid, name, album)
+  VALUES ('delete', old.id, old.name, old.album);
+  INSERT INTO songs_fts(rowid, name, album)
+  VALUES (new.id, new.name, new.album);
+END;
+"""
+
+DROP_SCHEMA = """
+DROP TABLE IF EXISTS songs_fts;
+DROP TABLE IF EXISTS songs;
+DROP TABLE IF EXISTS meta;
+"""
+
+# Only touches the songs that changed, so the unchanged
+# ones are not indexed again
+STORE_SONG = """
+INSERT INTO songs (file, modified, name, album) VALUES (?, ?, ?, ?)
+ON CONFLICT (file) DO UPDATE SET
+  modified = excluded.modified, name = excluded.name, album = excluded.album
+WHERE songs.modified IS NOT excluded.modified
+"""
+
+def _iter_files(pairs):
+  """
+    Yields the songs of a listing from MPD as dictionaries, leaving out
+    the directories and playlists, which have keys such as
+    `Last-Modified` as well
+  """
+  song = None
+  for key, value in pairs:
+    if key in ('file', 'directory', 'playlist'):
+      if song is not None:
+        yield song
+      song = {} if key == 'file' else None
+
+    if song is not None:
+      song[key] = value
+
+  if song is not None:
+    yield song
+
+def _match_query(query):
+  """
+    Turns what was typed into a FTS5 query where every word has to
+    start a word of the song. Returns None if there is nothing to find
+  """
+  words = [x for x in query.split() if any(c.isalnum() for c in x)]
+  if not words:
+    return None
+
+  return ' '.join('"%s"*' % x.replace('"', '""') for x in words)
+
+class Library():
+  """
+    The index of the songs in the MPD database, stored at `path`
+  """
+  def __init__(self, path=LIBRARY_PATH):
+    if path != ':memory:':
+      os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    self.db = sqlite3.connect(path)
+    self.db.executescript(SCHEMA)
+
+    if self.get_meta('version') != str(SCHEMA_VERSION):
+      self.db.executescript(DROP_SCHEMA + SCHEMA)
+      with self.db:
+        self.set_meta('version', SCHEMA_VERSION)
+
+  def get_meta(self, key):
+    row = self.db.execute('SELECT value FROM meta WHERE key = ?',
+                          (key,)).fetchone()
+    return row[0] if row is not None else None
+
+  def set_meta(self, key, value):
+    self.db.execute('INSERT OR REPLACE INTO meta VALUES (?, ?)',
+                    (key, str(value)))
+
+  def count(self):
+    """Returns the number of songs in the index"""
+    return self.db.execute('SELECT COUNT(*) FROM songs').fetchone()[0]
+
+  def refresh(self, client):
+    """
+      Brings the index up to date with the database of MPD, through the
+      MpdClient `client`, if MPD updated its database since the last
+      time. Returns true if it had to, which is every time when MPD
+      does not give `db_update`.
+
+      MpdConnectionError is raised if MPD can not be reached, in which
+      case the index is left as it was.
+    """
+    refreshed = int(time.time())
+    stats = dict(client.command('stats'))
+    db_update = stats.get('db_update')
+
+    if db_update is not None:
+      since = self.get_meta('db_update')
+      if db_update == since:
+        return False
+    else:
+      log.info('MPD did not give db_update, so the index can not tell if '
+               'the database changed and fetches what changed since the '
+               'last refresh')
+      since = self.get_meta('refreshed')
+
+    songs = int(stats.get('songs', -1))
+
+    with self.db:
+      if since is None or not self._store_changed(client, since, songs):
+        self._store_all(client)
+
+      if db_update is not None:
+        self.set_meta('db_update', db_update)
+      self.set_meta('refreshed', refreshed)
+
+    return True
+
+  def _store(self, songs):
+    """Stores the `songs`, returning the files of them"""
+    files = []
+
+    def rows():
+      for song in songs:
+        files.append(song['file'])
+        yield (song['file'], song.get('Last-Modified'), song_name(song),
+               song.get('Album', ''))
+
+    self.db.executemany(STORE_SONG, rows())
+    return files
+
+  def _forget_others(self, files):
+    """Removes the songs that are not in `files`"""
+    self.db.execute('CREATE TEMP TABLE IF NOT EXISTS seen '
+                    '(file TEXT PRIMARY KEY)')
+    self.db.execute('DELETE FROM temp.seen')
+    self.db.executemany('INSERT OR IGNORE INTO temp.seen VALUES (?)',
+                        ((x,) for x in files))
+    self.db.execute('DELETE FROM songs WHERE file NOT IN '
+                    '(SELECT file FROM temp.seen)')
+
+  def _store_all(self, client):
+    """Stores every song in the database of MPD"""
+    files = self._store(_iter_files(client.command_iter('listallinfo')))
+    self._forget_others(files)
+
+  def _store_changed(self, client, since, songs):
+    """
+      Stores the songs modified since the `since` update and forgets the
+      removed ones, MPD having `songs` songs. Returns false if MPD does
+      not support finding them or the number of songs does not add up
+    """
+    try:
+      self._store(_iter_files(client.command(
+          'find', "(modified-since '%s')" % since)))
+    except MpdError:
+      return False
+
+    # The new and changed songs are in the index now, so any
+    # songs more than MPD has must have been removed
+    if self.count() != songs:
+      self._forget_others(value for key, value
+                          in client.command_iter('listall') if key == 'file')
+
+    return self.count() == songs
+
+  def search(self, query, limit=SEARCH_LIMIT):
+    """
+      Returns the first `limit` songs matching `query`, in the order of
+      the library, as dictionaries with `name` and `file`
+    """
+    match = _match_query(query)
+    if match is None:
+      return []
+
+    rows = self.db.execute(
+        'SELECT songs.name, songs.file FROM songs_fts '
+        'JOIN songs ON songs.id = songs_fts.rowid '
+        'WHERE songs_fts MATCH ? LIMIT ?', (match, limit))
+
+    return [{'name': name, 'file': file} for name, file in rows]
+
+  def close(self):
+    self.db.close()
@@ -0,0 +1,312 @@
+"""
+  Instrumentation for the scripts of the bar, the popups and the i3
+  scripts. With BLOCKS_METRICS set to a file (or to `1` for METRICS_PATH)
+  the hot paths record how long they take and how often they happen:
+
+    @timed('mpd.run_mpc')
+    def run_mpc(msg):
+      ...
+
+    with timer('grabber.get_tree'):
+      tree = i3.get_tree()
+
+    count('block.keyboard.skipped')
+
+  Timings are kept as histograms, with BUCKETS_PER_DOUBLING buckets for
+  each power of two microseconds, so they take the same little space no
+  matter how often something runs. Each process appends what it recorded
+  to the file as a line of JSON when it exits, and every FLUSH_INTERVAL
+  seconds while it keeps running so the daemons show up as well.
+  The `metrics` script sums up the file into counts and percentiles.
+
+  Without BLOCKS_METRICS, `timed` gives back the function as it was and
+  `timer` and `count` return straight away, so the instrumentation can
+  be left in the hot paths. What is only needed for writing or summing
+  up the metrics is imported when first used, so importing this does not
+  slow down the start of the scripts.
+"""
+import functools
+import threading
+import atexit
+import math
+import time
+import sys
+import os
+
+METRICS_PATH = os.path.join(os.environ.get('XDG_RUNTIME_DIR', '/tmp'),
+                            'blocks-metrics-%d.log' % os.getuid())
+
+# Seconds between writing the metrics of a process that keeps running
+FLUSH_INTERVAL = 60
+
+BUCKETS_PER_DOUBLING = 4
+
+def _get_path():
+  path = os.environ.get('BLOCKS_METRICS', '')
+  if path in ('', '0'):
+    return None
+  if path == '1':
+    return METRICS_PATH
+  return os.path.expanduser(path)
+
+PATH = _get_path()
+ENABLED = PATH is not None
+
+PROGRAM = os.path.basename((getattr(sys, 'argv', None) or ['python'])[0])
+
+lock = threading.Lock()
+counters = {}
+
+# Name to [count, total seconds, max seconds, {bucket: count}]
+histograms = {}
+
+last_flush = time.monotonic()
+
+def bucket_of(seconds):
+  """Returns the bucket that `seconds` goes in"""
+  micros = seconds * 1000000
+  if micros < 1:
+    return 0
+  return int(math.log2(micros) * BUCKETS_PER_DOUBLING) + 1
+
+def bucket_limit(bucket):
+  """Returns the upper limit of `bucket` in seconds"""
+  return 2 ** (bucket / BUCKETS_PER_DOUBLING) / 1000000
+
+def observe(name, seconds):
+  """Records that `name` took `seconds`"""
+  if not ENABLED:
+    return
+
+  bucket = bucket_of(seconds)
+
+  with lock:
+    histogram = histograms.get(name)
+    if histogram is None:
+      histogram = histograms[name] = [0, 0.0, 0.0, {}]
+
+    histogram[0] += 1
+    histogram[1] += seconds
+    histogram[2] = max(histogram[2], seconds)
+    histogram[3][bucket] = histogram[3].get(bucket, 0) + 1
+    record = take_record(stale_only=True)
+
+  if record is not None:
+    write_record(record)
+
+def count(name, num=1):
+  """Adds `num` to the counter `name`"""
+  if not ENABLED:
+    return
+
+  with lock:
+    counters[name] = counters.get(name, 0) + num
+    record = take_record(stale_only=True)
+
+  if record is not None:
+    write_record(record)
+
+class Timer():
+  """Records how long the `with` block takes as `name`"""
+  __slots__ = ('name', 'start')
+
+  def __init__(self, name):
+    self.name = name
+
+  def __enter__(self):
+    self.start = time.perf_counter()
+    return self
+
+  def __exit__(self, *exc_info):
+    observe(self.name, time.perf_counter() - self.start)
+    return False
+
+class NullTimer():
+  """What `timer` gives when the metrics are disabled"""
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exc_info):
+    return False
+
+NULL_TIMER = NullTimer()
+
+def timer(name):
+  """Returns a context manager recording how long its block takes"""
+  return Timer(name) if ENABLED else NULL_TIMER
+
+def timed(name=None):
+  """
+    Decorator recording how long each call of the function takes, as
+    `name` or the module and name of the function
+  """
+  def decorate(func):
+    if not ENABLED:
+      return func
+
+    metric = name or '%s.%s' % (func.__module__, func.__qualname__)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+      start = time.perf_counter()
+      try:
+        return func(*args, **kwargs)
+      finally:
+        observe(metric, time.perf_counter() - start)
+
+    return wrapper
+  return decorate
+
+def take_record(stale_only=False):
+  """
+    Returns what was recorded since the last flush as a record for the
+    file and starts over, or None if there is nothing to write. With
+    `stale_only`, only once FLUSH_INTERVAL has passed. Has to be called
+    holding `lock`, so only one thread takes the record
+  """
+  global last_flush
+
+  now = time.monotonic()
+  if stale_only and now - last_flush < FLUSH_INTERVAL:
+    return None
+
+  last_flush = now
+  if not counters and not histograms:
+    return None
+
+  record = {
+    'p': PROGRAM,
+    't': int(time.time()),
+    'c': dict(counters),
+    'h': {name: [num, round(total, 6), round(longest, 6), buckets]
+          for name, (num, total, longest, buckets) in histograms.items()},
+  }
+  counters.clear()
+  histograms.clear()
+  return record
+
+def flush():
+  """Appends what was recorded since the last flush to the file"""
+  with lock:
+    record = take_record()
+
+  if record is not None:
+    write_record(record)
+
+def write_record(record):
+  """Appends `record` to the file as a line of JSON"""
+  import json
+
+  # A single write to a file opened for appending, so the lines of
+  # processes writing at the same time do not end up mixed
+  line = json.dumps(record, separators=(',', ':')) + '\n'
+  try:
+    fd = os.open(PATH, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+    try:
+      os.write(fd, line.encode('utf-8'))
+    finally:
+      os.close(fd)
+  except OSError:
+    pass
+
+if ENABLED:
+  atexit.register(flush)
+
+# Summing up the file
+
+def read_metrics(path):
+  """
+    Returns the counters and the histograms of all the lines in the file
+    added together, the histograms as [count, total, max, {bucket: count}]
+  """
+  import collections
+  import json
+
+  total_counters = collections.Counter()
+  total_histograms = {}
+
+  with open(path) as f:
+    for line in f:
+      try:
+        record = json.loads(line)
+      except ValueError:
+        continue
+
+      total_counters.update(record.get('c', {}))
+
+      for name, (num, total, longest, buckets) in record.get('h', {}).items():
+        histogram = total_histograms.setdefault(name, [0, 0.0, 0.0, {}])
+        histogram[0] += num
+        histogram[1] += total
+        histogram[2] = max(histogram[2], longest)
+        for bucket, bucket_count in buckets.items():
+          bucket = int(bucket)
+          histogram[3][bucket] = histogram[3].get(bucket, 0) + bucket_count
+
+  return dict(total_counters), total_histograms
+
+def percentile(histogram, percent):
+  """Returns the upper limit of the bucket with the `percent` percentile"""
+  num, _, longest, buckets = histogram
+  wanted = percent / 100 * num
+  seen = 0
+
+  for bucket in sorted(buckets):
+    seen += buckets[bucket]
+    if seen >= wanted:
+      return min(bucket_limit(bucket), longest)
+
+  return longest
+
+def format_time(seconds):
+  if seconds >= 1:
+    return '%7.2fs ' % seconds
+  if seconds >= 0.001:
+    return '%7.2fms' % (seconds * 1000)
+  return '%7.2fus' % (seconds * 1000000)
+
+def format_metrics(counters, histograms):
+  """Returns the lines of the summary of the metrics"""
+  lines = []
+
+  if histograms:
+    lines.append('%-36s %8s %9s %9s %9s %9s %9s' % (
+        'timing', 'count', 'mean', 'p50', 'p90', 'p99', 'max'))
+    for name in sorted(histograms):
+      histogram = histograms[name]
+      lines.append('%-36s %8d %s %s %s %s %s' % (
+          name, histogram[0], format_time(histogram[1] / histogram[0]),
+          format_time(percentile(histogram, 50)),
+          format_time(percentile(histogram, 90)),
+          format_time(percentile(histogram, 99)),
+          format_time(histogram[2])))
+
+  if counters:
+    if lines:
+      lines.append('')
+    lines.append('%-36s %8s' % ('counter', 'count'))
+    for name in sorted(counters):
+      lines.append('%-36s %8d' % (name, counters[name]))
+
+  return lines
+
+def main(argv=None):
+  import argparse
+
+  parser = argparse.ArgumentParser(
+      description='Sums up the metrics written with BLOCKS_METRICS set')
+  parser.add_argument('path', nargs='?', default=PATH or METRICS_PATH)
+  parser.add_argument('--clear', action='store_true',
+                      help='empty the file after summing it up')
+  args = parser.parse_args(argv)
+
+  try:
+    counters, histograms = read_metrics(args.path)
+  except OSError as e:
+    print('Unable to read the metrics: %s' % e, file=sys.stderr)
+    sys.exit(1)
+
+  print('\n'.join(format_metrics(counters, histograms)) or 'No metrics yet')
+
+  if args.clear:
+    open(args.path, 'w').close()
@@ -3,39 +3,113 @@
   when dealing with MPC. Everything is encapsulated into a nice
   MPC class that can be instanciated.
 
-  MPC class has an update_song_time, which should, if possible,
-  be executed every second through a loop / threading of some
-  kind. When the song time gets above the maximum for the song,
-  it will update the information in the class as it assumes
-  that a new song is now playing.
+  The song time (SongTime) keeps itself up to date from the monotonic
+  clock, so nothing has to count it up every second. MPC class has an
+  update_song_time, which should be called when the time is shown.
+  When the song time gets above the maximum for the song, it will
+  update the information in the class as it assumes that a new song
+  is now playing.
+
+  MPC talks to MPD directly over a single long lived connection
+  (see MpdClient), which saves forking `mpc` for every action. Should
+  MPD not be reachable through the socket, the `mpc` program is used
+  as a fallback.
+
+  Instead of polling, callbacks can be registered with `subscribe` and
+  `start_listening` will then call them whenever MPD reports that the
+  player, mixer, options or playlist changed, including changes made by
+  other clients.
+
+  Several commands can be sent to MPD in one go by running them
+  inside `with mpc.batch():`.
+
+  AsyncMpc is for controlling several MPD servers at once (multi room)
+  from asyncio. It talks to all of them at the same time, so fetching
+  the status of every server or pausing them all only takes as long as
+  the slowest one, and a server that does not respond within its
+  timeout is left out instead of holding up the rest.
+
+  When `mpc` has to be used, it is asked to show the current song in
+  MPC_FORMAT, with the fields separated by tabs, so nothing has to be
+  guessed from `artist - title` (which breaks on artists like Jay-Z).
 """
+import contextlib
 import subprocess
+import asyncio
+import threading
+import socket
+import select
+import time
 import re
 import math
+import os
+
+from lib.metrics import timed
 
 class SongTime():
   """
     Wrapper class for song time. Expects current and end to
     be of the format `00:00`.
     Can be used to keep track of the song status
+
+    The time MPD reported is stored together with when it was reported,
+    on the monotonic clock. While `playing`, the current time is worked
+    out from those whenever it is asked for, so it does not drift when a
+    timer fires late and nothing has to tick it along. Setting `current`
+    (a seek) or `set_playing` (a pause) starts it over from there.
   """
-  def __init__(self, current, end):
+  def __init__(self, current, end, playing=False):
     current_min, current_sec = [int(x) for x in current.split(':')]
     end_min, end_sec = [int(x) for x in end.split(':')]
 
+    self.playing = playing
     self.current = current_min * 60 + current_sec
     self.end = end_min * 60 + end_sec
 
+  @classmethod
+  def from_seconds(cls, current, end, playing=False):
+    """Creates a SongTime from the current and end time in seconds"""
+    song_time = cls('0:00', '0:00', playing)
+    song_time.current = current
+    song_time.end = end
+    return song_time
+
+  @property
+  def current(self):
+    """The current time in seconds"""
+    if not self.playing:
+      return self.elapsed
+    return self.elapsed + time.monotonic() - self.anchor
+
+  @current.setter
+  def current(self, seconds):
+    self.elapsed = seconds
+    self.anchor = time.monotonic()
+
+  def set_playing(self, playing):
+    """Starts or stops the time from going forward"""
+    current = self.current
+    self.playing = playing
+    self.current = current
+
   def increase(self, seconds=1):
-    """Increases the current status by `seconds`"""
-    self.current = self.current + seconds
+    """
+      Kept for the callers that still tick the time along every second.
+      The time keeps going by itself, so nothing is added to it and
+      `seconds` is ignored. Returns true if the song has finished
+    """
+    return self.is_finished()
 
-    return self.current >= self.end
+  def is_finished(self):
+    """Returns true if the current time has reached the end"""
+    return self.end > 0 and self.current >= self.end
 
   def as_progress_string(self):
     """Returns the status as a strong of 00:00 / 00:00"""
-    cm = math.floor(self.current / 60)
-    cs = self.current - (cm * 60)
+    current = min(int(self.current), self.end) if self.end > 0 \
+              else int(self.current)
+    cm = math.floor(current / 60)
+    cs = current - (cm * 60)
     em = math.floor(self.end / 60)
     es = self.end - (em * 60)
 
@@ -48,15 +122,16 @@ class SongTime():
     """Returns how far the song is along as a fraction, ex 0.85"""
     if self.end == 0:
       return 0
-    return self.current / self.end
+    return max(0, min(1, self.current / self.end))
 
+# The values used when nothing is playing. Use `_default_values`
+# to get them, which also gives a SongTime of its own
 DEFAULT_VALUES = {
   'artist': 'None',
   'song': 'None',
   'status': 'Stopped',
   'num': 0,
   'num_of': 0,
-  'song_time': SongTime('0:00', '0:00'),
   'progress_percent': 0,
   'volume': 0,
   'repeat': False,
@@ -72,13 +147,67 @@ LEGAL_MODIFIERS = [
   'repeat'
 ]
 
-def _remove_ws(s):
-  return re.sub('\s+', ' ', s)
+# The MPD subsystems that change what is stored in the Mpc class
+IDLE_SUBSYSTEMS = [
+  'player',
+  'mixer',
+  'options',
+  'playlist'
+]
+
+# Seconds to wait before trying to reconnect while listening
+RECONNECT_DELAY = 5
+
+# How mpc is asked to show the current song: artist, title, name (of
+# streams) and file, separated by tabs
+MPC_FORMAT = '[%artist%]\t[%title%]\t[%name%]\t%file%'
+MPC_STATUS = ['-f', MPC_FORMAT, 'status']
+
+# `[playing] #3/10   1:02/4:05 (25%)`
+STATE_PATTERN = re.compile(r'^\[(\w+)\]\s+#(\d+)/(\d+)\s+([\d:]+)/([\d:]+)')
+
+# `volume: 50%   repeat: off   random: on    single: off   consume: off`
+OPTION_PATTERN = re.compile(r'(volume|repeat|random|single|consume):\s*(\S+)')
+
+def _default_values():
+  """Returns a new dictionary with the values for when nothing is playing"""
+  values = dict(DEFAULT_VALUES)
+  values['song_time'] = SongTime.from_seconds(0, 0)
+  return values
+
+def _to_seconds(text):
+  """Turns a time like `4:05` or `1:02:03` into seconds"""
+  seconds = 0
+  for part in text.split(':'):
+    seconds = seconds * 60 + int(part or 0)
+  return seconds
+
+def _parse_options(values, options):
+  """Sets the volume and modifiers from `options` (name to text)"""
+  volume = options.get('volume', '')
+  values['volume'] = int(volume.rstrip('%')) if volume.rstrip('%').isdigit() \
+                     else 0
+
+  for name in LEGAL_MODIFIERS:
+    values[name] = options.get(name) in ('on', '1')
+
+def _parse_song_line(line):
+  """Returns the artist and song from the song line of mpc"""
+  if '\t' in line:
+    artist, title, name, path = (line.split('\t') + ['', '', ''])[:4]
+    return artist or 'None', title or name or os.path.basename(path)
+
+  # mpc did not use MPC_FORMAT, so this is `artist - title`
+  artist, separator, song = line.partition(' - ')
+  if not separator:
+    return 'None', line.strip()
+  return artist.strip(), song.strip()
 
 def _parse_output(output):
   """
-    Parses the output of mpc from a string to a more useful format of
-    a dictionary. The output format has the key/type of:
+    Parses the output of `mpc -f MPC_FORMAT status` from a string to a
+    more useful format of a dictionary. The output format has the
+    key/type of:
 
     `artist`, str           - Name of the artist
     `song`, str             - Name of the song
@@ -93,39 +222,41 @@ def _parse_output(output):
 
     Should an error occur or an mpd server is not running, it will
     give default values which should be of the same types as above,
-    but won't be any informative.
+    but won't be any informative. A new dictionary is returned each time.
     """
+  values = _default_values()
+
   if 'mpd error:' in output:
-    return DEFAULT_VALUES
+    return values
 
   lines = [x for x in output.split('\n') if x != '']
+  if not lines:
+    return values
 
-  try:
-    artist, song = [x.strip() for x in lines[0].split('-', 1)]
-    status, num, progress, _ = _remove_ws(lines[1]).split(' ')
-  except Exception:
-    artist, song = ('None', 'None')
-    status, num, progress = 'Stopped', '#0/0', '00:00/00:00'
-  volume, repeat, random, single, consume = _remove_ws(
-      re.sub('\w+:', '', lines[len(lines)-1]).strip()).split(' ')
-
-  num, num_of = num.split('/')
-  start_time, end_time = progress.split('/')
-
-  return {
-    'artist': artist,
-    'song': song,
-    'status': re.sub('\[|\]', '', status),
-    'num': int(num.replace('#', '')),
-    'num_of': int(num_of),
-    'song_time': SongTime(start_time, end_time),
-    'volume': int(volume.replace('%', '')),
-    'repeat': repeat == 'on',
-    'random': random == 'on',
-    'single': single == 'on',
-    'consume': consume == 'on'
-  }
+  # The options are always on the last line, while the song and its
+  # state are only there when something is playing
+  _parse_options(values, dict(OPTION_PATTERN.findall(lines[-1])))
+
+  for i, line in enumerate(lines[:-1]):
+    state = STATE_PATTERN.match(line)
+    if state is None:
+      continue
+
+    status, num, num_of, current, end = state.groups()
+    if i > 0:
+      values['artist'], values['song'] = _parse_song_line(lines[i - 1])
 
+    values['status'] = status
+    values['num'] = int(num)
+    values['num_of'] = int(num_of)
+    values['song_time'] = SongTime.from_seconds(_to_seconds(current),
+                                                _to_seconds(end),
+                                                status == 'playing')
+    break
+
+  return values
+
+@timed('mpd.run_mpc')
 def run_mpc(msg):
   """ Runs the `mpc` program with the msg """
   if not isinstance(msg, list):
@@ -141,16 +272,514 @@ def run_mpc(msg):
 
   return output
 
+def _iter_mpc(msg):
+  """
+    Like `run_mpc`, but yields the lines of the output as mpc writes
+    them instead of reading all of it first
+  """
+  try:
+    process = subprocess.Popen(['mpc'] + msg, stdout=subprocess.PIPE,
+                               stderr=subprocess.DEVNULL)
+  except OSError:
+    return
+
+  try:
+    for line in process.stdout:
+      yield line.decode('utf-8', 'replace').rstrip('\n')
+  finally:
+    if process.poll() is None:
+      process.kill()
+    process.stdout.close()
+    process.wait()
+
+def _iter_mpc_playlist(skip=0):
+  """Yields the songs of `mpc playlist`, leaving out the first `skip`"""
+  index = 0
+  for name in _iter_mpc(['playlist']):
+    if name == '':
+      continue
+
+    index += 1
+    if index > skip:
+      yield {'name': name, 'index': index}
+
+def song_name(song):
+  """
+    Formats a song dictionary from MPD the same way `mpc` does by default,
+    which is `[name: ][artist - ]title`, falling back to the file name
+  """
+  title = song.get('Title')
+  name = song.get('Name')
+
+  if title and song.get('Artist'):
+    title = '%s - %s' % (song['Artist'], title)
+
+  if name and title:
+    return '%s: %s' % (name, title)
+
+  return name or title or song.get('file', '')
+
+def _parse_status(status, song):
+  """
+    Turns the dictionaries given by the MPD `status` and `currentsong`
+    commands into the same format as `_parse_output` does.
+  """
+  values = _default_values()
+  _parse_options(values, status)
+
+  state = status.get('state', 'stop')
+  if state == 'stop':
+    return values
+
+  # `elapsed` and `duration` are more precise than `time`,
+  # but older versions of MPD only have the latter
+  elapsed, _, total = status.get('time', '0:0').partition(':')
+  elapsed = float(status.get('elapsed', elapsed))
+  total = int(float(status.get('duration', total or 0)))
+
+  values['artist'] = song.get('Artist', 'None')
+  values['song'] = song.get('Title') or song.get('Name') or \
+                   os.path.basename(song.get('file', 'None'))
+  values['status'] = 'playing' if state == 'play' else 'paused'
+  values['num'] = int(status.get('song', -1)) + 1
+  values['num_of'] = int(status.get('playlistlength', 0))
+  values['song_time'] = SongTime.from_seconds(elapsed, total, state == 'play')
+  return values
+
+class MpdError(Exception):
+  """Raised when MPD responds to a command with an error (ACK)"""
+
+class MpdConnectionError(MpdError):
+  """Raised when MPD cannot be reached or the connection broke"""
+
+class MpdClient():
+  """
+    A small client speaking the MPD text protocol over one long lived
+    TCP or unix socket. The host and port defaults to the same as `mpc`,
+    which is `MPD_HOST` and `MPD_PORT` or localhost:6600. A host
+    starting with `/` is treated as the path to a unix socket and
+    `password@host` is supported as well.
+
+    The connection is opened on the first command. If it has been
+    closed in the meantime (MPD closes idle clients after a while), it
+    reconnects before sending the command. A command is only sent again
+    if writing it failed, as once it is sent MPD may have run it, and
+    commands like `add` or `next` must not run twice. Otherwise the
+    error is given as a MpdConnectionError.
+  """
+  def __init__(self, host=None, port=None, timeout=5):
+    host = host or os.environ.get('MPD_HOST', 'localhost')
+    self.password, _, self.host = host.rpartition('@')
+    self.port = int(port or os.environ.get('MPD_PORT', 6600))
+    self.timeout = timeout
+    self.sock = None
+    self.rfile = None
+    self.lock = threading.Lock()
+
+    # The thread going through a `command_iter`, which holds the lock
+    self.iterating = None
+
+  def clone(self):
+    """Returns a new, unconnected client for the same MPD server"""
+    client = MpdClient(self.host, self.port, self.timeout)
+    client.password = self.password
+    return client
+
+  def connect(self):
+    """Opens the connection to MPD, reading the greeting it sends"""
+    self.disconnect()
+
+    try:
+      if self.host.startswith('/'):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.host)
+      else:
+        self.sock = socket.create_connection((self.host, self.port),
+                                             self.timeout)
+      self.rfile = self.sock.makefile('rb')
+      greeting = self._read_line()
+    except OSError as e:
+      self.disconnect()
+      raise MpdConnectionError('Unable to connect to MPD: %s' % e)
+
+    if not greeting.startswith('OK MPD '):
+      self.disconnect()
+      raise MpdConnectionError('Unexpected greeting from MPD: %s' % greeting)
+
+    if self.password:
+      self._execute('password', (self.password,))
+
+  def disconnect(self):
+    """Closes the connection, if it is open"""
+    if self.rfile is not None:
+      self.rfile.close()
+    if self.sock is not None:
+      self.sock.close()
+    self.sock = None
+    self.rfile = None
+
+  def is_connected(self):
+    """Returns true if there is an open connection to MPD"""
+    return self.sock is not None
+
+  @timed('mpd.command')
+  def command(self, name, *args):
+    """
+      Sends the command `name` with `args` to MPD and returns the
+      response as a list of (key, value) tuples.
+
+      Raises MpdError if MPD did not accept the command and
+      MpdConnectionError if MPD could not be reached at all.
+    """
+    self._check_iterating()
+    with self.lock:
+      self._send(_format_command(name, args))
+      return self._read_response()
+
+  @timed('mpd.command_list')
+  def command_list(self, commands):
+    """
+      Sends a list of (name, args) commands to MPD in one go and returns
+      a list with the response of each, which are lists of (key, value)
+      tuples like the ones `command` returns.
+
+      MPD stops at the first command that fails, in which case MpdError
+      is raised and the commands after it have not been run.
+    """
+    lines = ['command_list_ok_begin\n']
+    lines += [_format_command(name, args) for name, args in commands]
+    lines += ['command_list_end\n']
+    data = ''.join(lines)
+
+    self._check_iterating()
+    with self.lock:
+      self._send(data)
+      return self._read_list(len(commands))
+
+  def command_iter(self, name, *args):
+    """
+      Like `command`, but yields the (key, value) tuples as they are read
+      instead of collecting them, for responses too big to keep around.
+
+      The client is locked until the generator is used up or closed, so
+      it should be gone through straight away. Closing it early drops
+      the connection, as the rest of the response is still on its way.
+      Sending another command from the same thread while going through
+      it would wait for the lock forever, so that raises RuntimeError
+      instead. Collect what is needed first, or use a `clone`.
+    """
+    self._check_iterating()
+    with self.lock:
+      self._send(_format_command(name, args))
+
+      self.iterating = threading.get_ident()
+      try:
+        yield from self._read_pairs()
+      except GeneratorExit:
+        self.disconnect()
+        raise
+      finally:
+        self.iterating = None
+
+  def _check_iterating(self):
+    """
+      Raises RuntimeError if this thread is going through a
+      `command_iter`, as taking the lock again would never return
+    """
+    if self.iterating == threading.get_ident():
+      raise RuntimeError('The MPD client is in use by command_iter, '
+                         'finish going through it before sending commands')
+
+  def _read_list(self, length):
+    """Reads the `length` responses of a command list"""
+    responses = [[]]
+    while True:
+      line = self._read_line()
+      if line == 'OK':
+        return responses[:length]
+      if line == 'list_OK':
+        responses.append([])
+      elif line.startswith('ACK '):
+        raise MpdError(line)
+      else:
+        key, _, value = line.partition(': ')
+        responses[-1].append((key, value))
+
+  def idle(self, *subsystems):
+    """
+      Waits until MPD reports a change in one of `subsystems`, or in any
+      subsystem if none are given, and returns the names of the ones that
+      changed. The connection can not be used for anything else while
+      waiting, so this is best used on a client of its own.
+    """
+    self._check_iterating()
+    with self.lock:
+      if self.sock is None:
+        self.connect()
+
+      self._write(_format_command('idle', subsystems))
+      self.sock.settimeout(None)
+      try:
+        pairs = self._read_response()
+      finally:
+        if self.sock is not None:
+          self.sock.settimeout(self.timeout)
+
+    return [value for key, value in pairs if key == 'changed']
+
+  def noidle(self):
+    """
+      Makes a running `idle` return straight away. This is meant to be
+      called from a different thread than the one waiting in `idle`
+    """
+    try:
+      if self.sock is not None:
+        self.sock.sendall(b'noidle\n')
+    except OSError:
+      pass
+
+  def _execute(self, name, args):
+    """Writes the command and reads its response"""
+    self._write(_format_command(name, args))
+    return self._read_response()
+
+  def _send(self, data):
+    """
+      Writes `data`, connecting first if there is no connection or MPD
+      closed it. Writing is tried once more on a new connection if it
+      failed, but nothing is sent again after that
+    """
+    if self.sock is not None and self._is_closed():
+      self.disconnect()
+
+    if self.sock is None:
+      self.connect()
+
+    try:
+      self._write(data)
+    except MpdConnectionError:
+      self.connect()
+      self._write(data)
+
+  def _is_closed(self):
+    """Returns true if MPD closed the connection, without reading"""
+    try:
+      readable, _, _ = select.select([self.sock], [], [], 0)
+      return bool(readable) and \
+             self.sock.recv(1, socket.MSG_PEEK | socket.MSG_DONTWAIT) == b''
+    except OSError:
+      return True
+
+  def _write(self, data):
+    try:
+      self.sock.sendall(data.encode('utf-8'))
+    except OSError as e:
+      self.disconnect()
+      raise MpdConnectionError('Lost connection to MPD: %s' % e)
+
+  def _read_line(self):
+    try:
+      line = self.rfile.readline()
+    except OSError as e:
+      self.disconnect()
+      raise MpdConnectionError('Lost connection to MPD: %s' % e)
+
+    if not line:
+      self.disconnect()
+      raise MpdConnectionError('MPD closed the connection')
+
+    return line.decode('utf-8', 'replace').rstrip('\n')
+
+  def _read_response(self):
+    """
+      Reads `key: value` lines until MPD ends the response with
+      `OK`, or raises MpdError if it ended with `ACK`
+    """
+    return list(self._read_pairs())
+
+  def _read_pairs(self, line=None):
+    """
+      Yields the (key, value) tuples of the response, starting with
+      `line` if the first line has already been read
+    """
+    if line is None:
+      line = self._read_line()
+
+    while line != 'OK':
+      if line.startswith('ACK '):
+        raise MpdError(line)
+
+      key, _, value = line.partition(': ')
+      yield key, value
+      line = self._read_line()
+
+def _quote(arg):
+  """Quotes an argument so MPD reads it as a single one"""
+  arg = str(arg).replace('\\', '\\\\').replace('"', '\\"')
+  return '"%s"' % arg
+
+def _format_command(name, args):
+  """Formats the command `name` with `args` as a line for MPD"""
+  return ' '.join([name] + [_quote(x) for x in args]) + '\n'
+
+def _split_songs(pairs):
+  """
+    Splits a list of (key, value) pairs from MPD into a list of
+    dictionaries, where each `file` key starts a new song
+  """
+  return list(_iter_songs(pairs))
+
+def _iter_songs(pairs):
+  """Like `_split_songs`, but yields the songs as the pairs come in"""
+  song = None
+  for key, value in pairs:
+    if key == 'file':
+      if song is not None:
+        yield song
+      song = {}
+    if song is not None:
+      song[key] = value
+
+  if song is not None:
+    yield song
+
 class Mpc():
-  def __init__(self):
+  def __init__(self, client=None):
+    self.client = client if client is not None else MpdClient()
+    self.callbacks = []
+    self.idle_client = None
+
+    # While batching, commands are collected in `batched` instead of
+    # sent. It is kept per thread, so the listening thread updating the
+    # class does not end up in a batch another thread is collecting
+    self.batch_state = threading.local()
+
+    # The playlist is cached together with the playlist version MPD
+    # gave it, so only the songs that changed have to be fetched again
+    self.playlist_version = None
+    self.playlist = []
+
     self.update()
 
+  @property
+  def batched(self):
+    """The commands batched by this thread, None if it is not batching"""
+    return getattr(self.batch_state, 'batched', None)
+
+  @batched.setter
+  def batched(self, commands):
+    self.batch_state.batched = commands
+
+  @property
+  def batch_update(self):
+    """Whether `update` was called in the batch of this thread"""
+    return getattr(self.batch_state, 'update', False)
+
+  @batch_update.setter
+  def batch_update(self, update):
+    self.batch_state.update = update
+
+  def _command(self, name, *args, fallback=None):
+    """
+      Sends a command to MPD through the client. If MPD cannot be reached
+      through it, `fallback` is given to `run_mpc` instead. Errors given by
+      MPD are ignored, the same way `run_mpc` ignores them.
+
+      Returns the response as a list of (key, value) tuples, or None if
+      the command did not go through the client or is being batched.
+    """
+    if self.batched is not None:
+      self.batched.append((name, args, fallback))
+      return None
+
+    try:
+      return self.client.command(name, *args)
+    except MpdConnectionError:
+      if fallback is not None:
+        run_mpc(fallback)
+    except MpdError:
+      pass
+
+    return None
+
+  @contextlib.contextmanager
+  def batch(self):
+    """
+      Collects the commands given inside the `with` block and sends them
+      to MPD as a single command list when the block ends, so they only
+      cost one round trip. Calling `update` inside the block makes the
+      status be fetched as part of the same list, after the commands.
+
+        with mpc.batch():
+          mpc.set_volume(50)
+          mpc.update()
+
+      Nothing is sent if the block raises an exception. Nested batches
+      are sent together with the outermost one. Only the commands of the
+      thread that opened the batch are collected, others are sent as
+      usual.
+    """
+    if self.batched is not None:
+      yield self
+      return
+
+    self.batched = []
+    self.batch_update = False
+    try:
+      yield self
+      commands, update = self.batched, self.batch_update
+    finally:
+      self.batched = None
+      self.batch_update = False
+
+    self._send_batch(commands, update)
+
+  def _send_batch(self, commands, update):
+    """Sends the batched `commands`, updating the class if `update`"""
+    command_list = [(name, args) for name, args, _ in commands]
+    if update:
+      command_list += [('status', ()), ('currentsong', ())]
+
+    if not command_list:
+      return
+
+    try:
+      responses = self.client.command_list(command_list)
+    except MpdConnectionError:
+      for _, _, fallback in commands:
+        if fallback is not None:
+          run_mpc(fallback)
+      if update:
+        self._set_info(run_mpc(MPC_STATUS))
+    except MpdError:
+      # MPD stopped at the failing command, so fetch the status
+      # on its own to find out where things ended up
+      if update:
+        self.update()
+    else:
+      if update:
+        self._set_info(_parse_status(dict(responses[-2]),
+                                     dict(responses[-1])))
+
   def update(self):
     """
-      Sends a status message to mpc retrieving current status
+      Sends a status message to mpd retrieving current status
       and updating this class
     """
-    self._set_info(run_mpc('status'))
+    if self.batched is not None:
+      self.batch_update = True
+      return
+
+    try:
+      status = dict(self.client.command('status'))
+      song = dict(self.client.command('currentsong'))
+    except MpdConnectionError:
+      self._set_info(run_mpc(MPC_STATUS))
+    except MpdError:
+      self._set_info(_default_values())
+    else:
+      self._set_info(_parse_status(status, song))
 
   def _set_info(self, mpc_info):
     """
@@ -177,18 +806,88 @@ class Mpc():
 
     return '%s - %s [%s]' % (self.artist, self.song, self.song_time.as_progress_string())
 
-  def update_song_time(self, seconds=1):
-    """Updates the song time stored by adding a second"""
-    if not self.is_playing():
-      return
+  def subscribe(self, callback):
+    """
+      Registers `callback` to be called as `callback(mpc, changed)` each
+      time MPD reports a change while listening, where `changed` is the
+      list of subsystems that changed. The class is updated before
+      the callbacks are called.
+
+      The callbacks are called from the listening thread, so GTK users
+      should hand the work over with `GLib.idle_add`.
+    """
+    self.callbacks.append(callback)
+
+  def unsubscribe(self, callback):
+    """Removes a callback registered with `subscribe`"""
+    self.callbacks.remove(callback)
+
+  def listen(self, subsystems=IDLE_SUBSYSTEMS):
+    """
+      Blocks while waiting for MPD to report changes in `subsystems`,
+      updating the class and calling the subscribed callbacks whenever
+      it does. The waiting is done on a connection of its own, so the
+      class can still be used from other threads in the meantime.
+
+      Returns when `stop_listening` is called.
+    """
+    self.idle_client = client = self.client.clone()
+
+    while self.idle_client is client:
+      try:
+        changed = client.idle(*subsystems)
+      except MpdConnectionError:
+        time.sleep(RECONNECT_DELAY)
+        continue
+      except MpdError:
+        break
+
+      if not changed or self.idle_client is not client:
+        continue
 
-    if self.song_time.increase(seconds):
+      self.update()
+      for callback in list(self.callbacks):
+        callback(self, changed)
+
+    client.disconnect()
+
+  def start_listening(self, subsystems=IDLE_SUBSYSTEMS):
+    """Runs `listen` in a background thread and returns the thread"""
+    thread = threading.Thread(target=self.listen, args=(subsystems,))
+    thread.daemon = True
+    thread.start()
+    return thread
+
+  def stop_listening(self):
+    """Makes `listen` return, no more callbacks are called after this"""
+    client, self.idle_client = self.idle_client, None
+    if client is not None:
+      client.noidle()
+
+  def update_song_time(self, seconds=None):
+    """
+      Updates the class if the song has ended, as a new song is then
+      probably playing. The song time keeps going by itself, so this is
+      only needed when it is shown and `seconds` is no longer used.
+    """
+    if self.is_playing() and self.song_time.is_finished():
       self.update()
 
   def toggle_status(self):
-    """Sets the status to playing if paused, otherwise pauses the song"""
+    """
+      Sets the status to playing if paused, otherwise pauses the song.
+      The status is fetched first, as the one kept in the class is stale
+      when something else paused or played since the last update. In a
+      batch, the cached status is used and the new one fetched after
+    """
+    self.update()
+
     self.status = 'paused' if self.status == 'playing' else 'playing'
-    run_mpc('toggle')
+    self.song_time.set_playing(self.status == 'playing')
+    if self.status == 'playing':
+      self._command('play', fallback=['play'])
+    else:
+      self._command('pause', '1', fallback=['pause'])
 
   def is_paused(self):
     """Returns true if it is paused"""
@@ -200,12 +899,77 @@ class Mpc():
 
   def get_playlist(self):
     """
-      Retrieves the current playlist mpc and splits it
+      Retrieves the current playlist from mpd and splits it
       into a list of dictionaries with `name` and `index` keys. The
       index are later used to play the song
+
+      The playlist is cached, so as long as MPD reports the same playlist
+      version this only costs a status query. When the version has
+      changed, only the songs that changed since are fetched. The
+      returned list is shared between calls and should not be changed.
     """
-    output = run_mpc('playlist')
-    return [{'name': name, 'index': i+1} for i, name in enumerate(output.split('\n'))]
+    try:
+      status = dict(self.client.command('status'))
+      version = status.get('playlist')
+      length = int(status.get('playlistlength', 0))
+
+      if self.playlist_version is None:
+        songs = _split_songs(self.client.command('playlistinfo'))
+        self.playlist = []
+      elif version != self.playlist_version:
+        songs = _split_songs(self.client.command('plchanges',
+                                                 self.playlist_version))
+      else:
+        return self.playlist
+    except MpdConnectionError:
+      self.playlist_version = None
+      return list(_iter_mpc_playlist())
+    except MpdError:
+      self.playlist_version = None
+      return []
+
+    # Songs removed from the end are not reported, so cut the list
+    # down to size before putting the changed songs in place
+    playlist = self.playlist[:length]
+    for song in songs:
+      pos = int(song.get('Pos', len(playlist)))
+      entry = {'name': song_name(song), 'index': pos+1}
+
+      if pos < len(playlist):
+        playlist[pos] = entry
+      else:
+        playlist.append(entry)
+
+    self.playlist = playlist
+    self.playlist_version = version
+    return playlist
+
+  def iter_playlist(self):
+    """
+      Yields the songs of the playlist one at a time, as dictionaries
+      like the ones `get_playlist` gives. The songs are parsed as they
+      are read from MPD (or mpc), so a huge playlist is never held in
+      memory all at once. This neither uses nor fills the cache.
+
+      The connection to MPD is busy until the generator is used up, so
+      nothing else can be sent through the client while going through
+      it. Doing so from the same thread raises RuntimeError.
+    """
+    count = 0
+
+    try:
+      for song in _iter_songs(self.client.command_iter('playlistinfo')):
+        count += 1
+        yield {'name': song_name(song),
+               'index': int(song.get('Pos', count - 1)) + 1}
+      return
+    except MpdConnectionError:
+      pass
+    except MpdError:
+      return
+
+    # Carry on with mpc from where MPD was lost
+    yield from _iter_mpc_playlist(skip=count)
 
   def play(self, song):
     """
@@ -216,17 +980,31 @@ class Mpc():
     """
 
     if isinstance(song, dict) and 'index' in song:
-      run_mpc(['play', str(song['index'])])
-    elif instance(song, int):
-      run_mpc(['play', str(song)])
+      song = song['index']
 
-    self.update()
+    with self.batch():
+      if isinstance(song, int):
+        # mpc counts songs from 1, while mpd counts them from 0
+        self._command('play', song - 1, fallback=['play', str(song)])
+
+      self.update()
+
+  def add(self, files):
+    """
+      Adds the songs with `files` to the end of the playlist, sending
+      them to MPD as a single command list
+    """
+    with self.batch():
+      for file in files:
+        self._command('add', file, fallback=['add', file])
 
   def toggle_modifier(self, name):
     """
       Toggles the modifier (random, consume, single or repeat)
     """
-    self.set_modifier(name, not self.get_modifier(name))
+    with self.batch():
+      self.set_modifier(name, not self.get_modifier(name))
+      self.update()
 
   def get_modifier(self, name):
     """
@@ -250,7 +1028,8 @@ class Mpc():
       msg = 'Illegal modifier %s, expected one of [%s]'
       raise Exception(msg % (name, ', '.join(LEGAL_MODIFIERS)))
 
-    run_mpc([name, 'on' if value else 'off'])
+    self._command(name, '1' if value else '0',
+                  fallback=[name, 'on' if value else 'off'])
     setattr(self, name, value)
 
   def set_volume(self, vol):
@@ -263,16 +1042,261 @@ class Mpc():
       vol = 0
     if vol != self.volume:
       self.volume = vol
-      run_mpc(['volume', str(self.volume)])
+      self._command('setvol', self.volume,
+                    fallback=['volume', str(self.volume)])
 
   def next_song(self):
     """Goes forward and starts playing the next song"""
-    run_mpc(['next'])
-    self.update()
+    with self.batch():
+      self._command('next', fallback=['next'])
+      self.update()
 
   def prev_song(self):
     """Goes backwards and starts playing the previous song"""
-    run_mpc(['prev'])
-    self.update()
+    with self.batch():
+      self._command('previous', fallback=['prev'])
+      self.update()
+
+class AsyncMpdClient():
+  """
+    Like MpdClient, but for asyncio. Every command has to be answered
+    within `timeout` seconds, connecting included, otherwise the
+    connection is dropped and MpdConnectionError raised.
+  """
+  def __init__(self, host=None, port=None, timeout=5):
+    host = host or os.environ.get('MPD_HOST', 'localhost')
+    self.password, _, self.host = host.rpartition('@')
+    self.port = int(port or os.environ.get('MPD_PORT', 6600))
+    self.timeout = timeout
+    self.reader = None
+    self.writer = None
+
+    # Made when first needed, as older versions of asyncio tie
+    # the lock to the loop that is running when it is made
+    self.lock = None
+
+  async def connect(self):
+    """Opens the connection to MPD, reading the greeting it sends"""
+    self.disconnect()
+
+    try:
+      if self.host.startswith('/'):
+        self.reader, self.writer = \
+            await asyncio.open_unix_connection(self.host)
+      else:
+        self.reader, self.writer = \
+            await asyncio.open_connection(self.host, self.port)
+      greeting = await self._read_line()
+    except OSError as e:
+      self.disconnect()
+      raise MpdConnectionError('Unable to connect to MPD: %s' % e)
+
+    if not greeting.startswith('OK MPD '):
+      self.disconnect()
+      raise MpdConnectionError('Unexpected greeting from MPD: %s' % greeting)
+
+    if self.password:
+      await self._exchange(_format_command('password', (self.password,)),
+                           self._read_response)
+
+  def disconnect(self):
+    """Closes the connection, if it is open"""
+    if self.writer is not None:
+      self.writer.close()
+    self.reader = None
+    self.writer = None
+
+  def is_connected(self):
+    """Returns true if there is an open connection to MPD"""
+    return self.writer is not None
+
+  async def command(self, name, *args):
+    """
+      Sends the command `name` with `args` to MPD and returns the
+      response as a list of (key, value) tuples, like MpdClient does
+    """
+    return await self._run(_format_command(name, args), self._read_response)
+
+  async def command_list(self, commands):
+    """
+      Sends a list of (name, args) commands to MPD in one go and returns
+      the response of each, like MpdClient does
+    """
+    lines = ['command_list_ok_begin\n']
+    lines += [_format_command(name, args) for name, args in commands]
+    lines += ['command_list_end\n']
+
+    return await self._run(''.join(lines),
+                           lambda: self._read_list(len(commands)))
+
+  async def _run(self, data, read):
+    """
+      Sends `data` and reads the response with `read`, reconnecting once
+      if the connection was closed, all within the timeout
+    """
+    if self.lock is None:
+      self.lock = asyncio.Lock()
+
+    async with self.lock:
+      try:
+        return await asyncio.wait_for(self._send(data, read), self.timeout)
+      except asyncio.TimeoutError:
+        # The rest of the response could still come, so the
+        # connection can not be used for anything else
+        self.disconnect()
+        raise MpdConnectionError('MPD did not respond within %s seconds' %
+                                 self.timeout)
+
+  async def _send(self, data, read):
+    if self.writer is None:
+      await self.connect()
+      return await self._exchange(data, read)
+
+    try:
+      return await self._exchange(data, read)
+    except MpdConnectionError:
+      await self.connect()
+      return await self._exchange(data, read)
+
+  async def _exchange(self, data, read):
+    """Writes `data` and returns what `read` reads"""
+    try:
+      self.writer.write(data.encode('utf-8'))
+      await self.writer.drain()
+    except OSError as e:
+      self.disconnect()
+      raise MpdConnectionError('Lost connection to MPD: %s' % e)
+
+    return await read()
+
+  async def _read_line(self):
+    try:
+      line = await self.reader.readline()
+    except (OSError, ValueError) as e:
+      self.disconnect()
+      raise MpdConnectionError('Lost connection to MPD: %s' % e)
+
+    if not line:
+      self.disconnect()
+      raise MpdConnectionError('MPD closed the connection')
+
+    return line.decode('utf-8', 'replace').rstrip('\n')
+
+  async def _read_response(self):
+    """
+      Reads `key: value` lines until MPD ends the response with
+      `OK`, or raises MpdError if it ended with `ACK`
+    """
+    pairs = []
+    while True:
+      line = await self._read_line()
+      if line == 'OK':
+        return pairs
+      if line.startswith('ACK '):
+        raise MpdError(line)
+
+      key, _, value = line.partition(': ')
+      pairs.append((key, value))
+
+  async def _read_list(self, length):
+    """Reads the `length` responses of a command list"""
+    responses = [[]]
+    while True:
+      line = await self._read_line()
+      if line == 'OK':
+        return responses[:length]
+      if line == 'list_OK':
+        responses.append([])
+      elif line.startswith('ACK '):
+        raise MpdError(line)
+      else:
+        key, _, value = line.partition(': ')
+        responses[-1].append((key, value))
+
+class AsyncMpc():
+  """
+    Controls several MPD servers at the same time from asyncio, such as
+    one for each room. `servers` maps a name to the host of each server
+    (anything MpdClient takes as host) or to an AsyncMpdClient.
+
+      mpc = AsyncMpc({'kitchen': 'kitchen.local', 'office': 'office.local'})
+      await mpc.update()
+      await mpc.pause()
+      await mpc.set_volume(40, servers=['kitchen'])
+
+    The commands are sent to all the servers at once with
+    `asyncio.gather`. Each server has its own `timeout`, so one that
+    does not respond only leaves out its own result. The methods return
+    a dictionary of the name of each server to its result, or to the
+    MpdError it raised.
+  """
+  def __init__(self, servers, timeout=2):
+    self.clients = {}
+    for name, host in servers.items():
+      if not isinstance(host, AsyncMpdClient):
+        host = AsyncMpdClient(host, timeout=timeout)
+      self.clients[name] = host
+
+    # The status of each server, as Mpc keeps it (see `_parse_status`),
+    # or None if the server could not be reached on the last update
+    self.status = dict.fromkeys(self.clients)
+
+  async def _gather(self, func, servers=None):
+    """Runs `func(client)` for `servers`, or all of them, at once"""
+    names = list(self.clients) if servers is None else list(servers)
+    results = await asyncio.gather(*[func(self.clients[x]) for x in names],
+                                   return_exceptions=True)
+
+    for result in results:
+      if isinstance(result, BaseException) and \
+         not isinstance(result, MpdError):
+        raise result
+
+    return dict(zip(names, results))
+
+  async def command(self, name, *args, servers=None):
+    """Sends the command `name` with `args` to every server"""
+    return await self._gather(lambda client: client.command(name, *args),
+                              servers)
+
+  async def update(self, servers=None):
+    """
+      Fetches the status of every server, updating `status`, and
+      returns the results
+    """
+    async def fetch(client):
+      status, song = await client.command_list([('status', ()),
+                                                ('currentsong', ())])
+      return _parse_status(dict(status), dict(song))
+
+    results = await self._gather(fetch, servers)
+    for name, result in results.items():
+      self.status[name] = None if isinstance(result, MpdError) else result
+
+    return results
+
+  async def play(self, servers=None):
+    """Starts or resumes playing everywhere"""
+    return await self.command('play', servers=servers)
+
+  async def pause(self, servers=None):
+    """Pauses everywhere"""
+    return await self.command('pause', '1', servers=servers)
+
+  async def set_volume(self, vol, servers=None):
+    """Sets the volume everywhere, where `vol` is between 0 and 100"""
+    vol = max(0, min(100, vol))
+    return await self.command('setvol', vol, servers=servers)
+
+  async def next_song(self, servers=None):
+    """Goes forward to the next song everywhere"""
+    return await self.command('next', servers=servers)
 
+  async def prev_song(self, servers=None):
+    """Goes back to the previous song everywhere"""
+    return await self.command('previous', servers=servers)
 
+  def close(self):
+    """Closes the connections to all the servers"""
+    for client in self.clients.values():
+      client.disconnect()
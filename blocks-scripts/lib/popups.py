@@ -0,0 +1,109 @@
+"""
+  Shows the popup windows of the bar, such as the calendar, through the
+  popup-server. The server has GTK and the windows ready, so a popup is
+  shown a lot faster than by starting its script. When the server is
+  not running, the script is started like before.
+
+  A request is a line with the name of the popup and where to show it,
+  such as `calendar 1200 1060`, which the server answers with `ok`.
+  `-` is used for a missing coordinate.
+
+  This does not import GTK, so the clients stay quick to start. For the
+  same reason asyncio is only imported by `show_popup_async`, which the
+  bar uses, and subprocess only when the server is not running.
+"""
+import socket
+import os
+
+SOCKET_PATH = os.path.join(os.environ.get('XDG_RUNTIME_DIR', '/tmp'),
+                           'popup-server-%d.sock' % os.getuid())
+
+SCRIPTS_PATH = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+# The scripts that show the popups without the server
+SCRIPTS = {
+  'calendar': 'calendar-window',
+}
+
+# Seconds to wait for the server to answer
+TIMEOUT = 1
+
+def format_request(name, x=None, y=None):
+  coordinates = ['-' if value is None or value == '' else str(int(value))
+                 for value in (x, y)]
+  return ('%s %s %s\n' % (name, coordinates[0], coordinates[1])).encode()
+
+def parse_request(line):
+  """Returns the name, x and y of a request, x and y being None if missing"""
+  words = line.decode('utf-8').split()
+  if not words:
+    raise ValueError('Empty request')
+
+  coordinates = [None if x == '-' else int(x) for x in words[1:3]]
+  coordinates += [None] * (2 - len(coordinates))
+  return words[0], coordinates[0], coordinates[1]
+
+def listen(path=SOCKET_PATH):
+  """
+    Returns the socket for the server to listen on, or None if
+    there already is a server listening
+  """
+  server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+
+  try:
+    server.connect(path)
+    server.close()
+    return None
+  except OSError:
+    pass
+
+  # Left behind by a server that was killed
+  if os.path.exists(path):
+    os.unlink(path)
+
+  server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+  server.bind(path)
+  server.listen(8)
+  return server
+
+def get_script(name, x=None, y=None):
+  """Returns the command that shows the popup without the server"""
+  args = [str(value) for value in (x, y) if value is not None and value != '']
+  return [os.path.join(SCRIPTS_PATH, SCRIPTS[name])] + args
+
+def request_popup(name, x=None, y=None):
+  """Asks the server to show the popup. Returns True if it did"""
+  try:
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+      sock.settimeout(TIMEOUT)
+      sock.connect(SOCKET_PATH)
+      sock.sendall(format_request(name, x, y))
+      return sock.recv(64).strip() == b'ok'
+  except OSError:
+    return False
+
+def show_popup(name, x=None, y=None):
+  """Shows the popup, with the server if it is running"""
+  if not request_popup(name, x, y):
+    import subprocess
+    subprocess.Popen(get_script(name, x, y))
+
+async def show_popup_async(name, x=None, y=None):
+  """Like `show_popup`, but without holding up the event loop"""
+  import asyncio
+
+  try:
+    reader, writer = await asyncio.wait_for(
+        asyncio.open_unix_connection(SOCKET_PATH), TIMEOUT)
+    try:
+      writer.write(format_request(name, x, y))
+      reply = await asyncio.wait_for(reader.readline(), TIMEOUT)
+    finally:
+      writer.close()
+
+    if reply.strip() == b'ok':
+      return
+  except (OSError, asyncio.TimeoutError):
+    pass
+
+  await asyncio.create_subprocess_exec(*get_script(name, x, y))
@@ -0,0 +1,157 @@
+"""
+  Shows the upload and download rate of the network interfaces, with
+  arrows where the one pointing up is upload and down is download.
+
+  Without an interface given, it shows all interfaces that have a link
+  (or, for wireless, are connected), with the name of each if there is
+  more than one.
+
+  The byte counters and the rates between the last few updates are kept
+  in memory, so the block can show the latest, average or peak rate.
+"""
+import collections
+import time
+import os
+
+from lib.i3bar import Block
+
+NET_PATH = '/sys/class/net'
+
+# Number of rates to keep for the average and peak
+HISTORY = 6
+
+# Seconds between checking which interfaces are up, even when
+# no interfaces have been added or removed
+RESCAN_INTERVAL = 60
+
+UNITS = ['b', 'k', 'm', 'g', 't', 'p']
+
+def read_int(path):
+  """Reads a file containing a single number"""
+  with open(path) as f:
+    return int(f.read())
+
+def format_rate(bits):
+  """
+    Formats bits per second in the closest unit, such as `  1.5m `,
+    only showing the first character of the unit to save space
+  """
+  index = 0
+  while bits > 1024 and index < len(UNITS) - 1:
+    bits = bits / 1024
+    index += 1
+
+  return ('%5.1f%s' % (bits, UNITS[index])).ljust(7)
+
+class RateMeter():
+  """
+    Keeps track of a byte counter, storing the rate in bits per
+    second between each read in a ring buffer
+  """
+  def __init__(self, history=HISTORY):
+    self.previous = None
+    self.rates = collections.deque(maxlen=history)
+
+  def add(self, count, timestamp):
+    """Adds a reading of the counter taken at `timestamp` nanoseconds"""
+    if self.previous is not None:
+      prev_count, prev_timestamp = self.previous
+      elapsed = max(timestamp - prev_timestamp, 1)
+      self.rates.append((count - prev_count) * 8 * 1e9 / elapsed)
+
+    self.previous = (count, timestamp)
+
+  def current(self):
+    return self.rates[-1] if self.rates else 0
+
+  def average(self):
+    return sum(self.rates) / len(self.rates) if self.rates else 0
+
+  def peak(self):
+    return max(self.rates) if self.rates else 0
+
+class BandwidthBlock(Block):
+  """
+    Block with the bandwidth of `interface` or of all active interfaces.
+    `mode` is either `current`, `average` or `peak`, where the latter two
+    are over the last `history` updates.
+  """
+  interval = 10
+
+  def __init__(self, name, interface=None, mode='current', history=HISTORY,
+               root=NET_PATH, **properties):
+    Block.__init__(self, name, **properties)
+    self.interface = interface
+    self.mode = mode
+    self.history = history
+    self.root = root
+    self.names = None
+    self.active = []
+    self.scanned = 0
+    self.meters = {}
+
+  def is_active(self, name):
+    """Checks whether the interface has a link and is up"""
+    path = os.path.join(self.root, name)
+
+    try:
+      with open(os.path.join(path, 'carrier')) as f:
+        carrier = f.read().strip()
+      with open(os.path.join(path, 'operstate')) as f:
+        operstate = f.read().strip()
+    except OSError:
+      return False
+
+    return carrier == '1' and operstate == 'up'
+
+  def get_interfaces(self):
+    """
+      Returns the interfaces to show. The list is only looked through
+      again when interfaces are added or removed, or every
+      `RESCAN_INTERVAL` seconds to notice links going up or down
+    """
+    if self.interface:
+      return [self.interface]
+
+    names = sorted(x for x in os.listdir(self.root) if x != 'lo')
+    now = time.monotonic()
+
+    if names != self.names or now - self.scanned > RESCAN_INTERVAL:
+      self.names = names
+      self.scanned = now
+      self.active = [x for x in names if self.is_active(x)]
+
+    return self.active
+
+  def sample(self, name):
+    """Reads the counters of the interface, returning its (tx, rx) meters"""
+    if name not in self.meters:
+      self.meters[name] = (RateMeter(self.history), RateMeter(self.history))
+
+    tx, rx = self.meters[name]
+    path = os.path.join(self.root, name, 'statistics')
+    timestamp = time.monotonic_ns()
+
+    tx.add(read_int(os.path.join(path, 'tx_bytes')), timestamp)
+    rx.add(read_int(os.path.join(path, 'rx_bytes')), timestamp)
+
+    return tx, rx
+
+  def rate(self, meter):
+    """Returns the rate of the meter according to the mode"""
+    return format_rate(getattr(meter, self.mode)())
+
+  def update(self):
+    try:
+      meters = [(name, self.sample(name)) for name in self.get_interfaces()]
+    except OSError:
+      # The interface is gone, so look through them again next time
+      self.names = None
+      return ''
+
+    if len(meters) == 1:
+      _, (tx, rx) = meters[0]
+      return '⇅ %s / %s' % (self.rate(tx), self.rate(rx))
+
+    return ''.join(' %s: ⇅ %s %s' % (name, self.rate(tx), self.rate(rx))
+                   for name, (tx, rx) in meters)
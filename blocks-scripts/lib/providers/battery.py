@@ -0,0 +1,167 @@
+"""
+  Shows the battery status of a laptop. Depending on the charge it is
+  colored red below 20%, yellow below 50% and green otherwise. While
+  discharging, the icon shows roughly how full the battery is, and it
+  is a plug while charging.
+
+  The batteries are read from the power_supply class in sysfs, which is
+  also where `acpi` gets them. The time until empty or full is estimated
+  from how the energy changed over the last few updates, falling back
+  to the power the battery reports when there is not enough history.
+  Nothing is shown if there is no battery.
+"""
+import collections
+import glob
+import time
+import os
+
+from lib.i3bar import Block
+
+POWER_SUPPLY_PATH = '/sys/class/power_supply'
+
+# Number of energy samples used for estimating the time left
+HISTORY = 10
+
+def read_file(path):
+  with open(path) as f:
+    return f.read().strip()
+
+class Battery():
+  """
+    A battery in sysfs. Batteries report either energy (µWh and µW) or
+    charge (µAh and µA), which are used the same way here.
+  """
+  def __init__(self, path):
+    self.path = path
+    self.prefix = 'energy' if os.path.exists(
+        os.path.join(path, 'energy_now')) else 'charge'
+    self.rate_file = 'power_now' if self.prefix == 'energy' else 'current_now'
+
+  def read(self, name):
+    return read_file(os.path.join(self.path, name))
+
+  def read_int(self, name):
+    try:
+      return int(self.read(name))
+    except (OSError, ValueError):
+      return 0
+
+  def status(self):
+    return self.read('status')
+
+  def now(self):
+    return self.read_int(self.prefix + '_now')
+
+  def full(self):
+    return self.read_int(self.prefix + '_full')
+
+  def rate(self):
+    return abs(self.read_int(self.rate_file))
+
+def find_batteries(root=POWER_SUPPLY_PATH):
+  """Returns the batteries in the power_supply class"""
+  batteries = []
+
+  for path in sorted(glob.glob(os.path.join(root, '*'))):
+    try:
+      if read_file(os.path.join(path, 'type')) == 'Battery':
+        batteries.append(Battery(path))
+    except OSError:
+      continue
+
+  return batteries
+
+def format_duration(seconds):
+  """Formats the time left like ` (~2h 05m)` or ` (~42m)`"""
+  hours, minutes = divmod(int(seconds) // 60, 60)
+
+  if hours > 0:
+    return ' (~%dh %02dm)' % (hours, minutes)
+  return ' (~%02dm)' % minutes
+
+class BatteryBlock(Block):
+  """Block with the charge of the batteries and the time left"""
+  interval = 30
+
+  def __init__(self, name, root=POWER_SUPPLY_PATH, history=HISTORY,
+               **properties):
+    Block.__init__(self, name, **properties)
+    self.root = root
+    self.batteries = None
+    self.status = None
+    self.samples = collections.deque(maxlen=history)
+
+  def time_left(self, status, now, full):
+    """
+      Estimates the seconds until the batteries are empty when
+      discharging, or full when charging. Returns None when unknown
+    """
+    if status not in ('Charging', 'Discharging'):
+      return None
+
+    # Start over when switching between charging and discharging
+    if status != self.status:
+      self.samples.clear()
+    self.samples.append((time.monotonic(), now))
+
+    rate = 0
+    (first_time, first), (last_time, last) = self.samples[0], self.samples[-1]
+    if last_time > first_time:
+      rate = abs(last - first) / (last_time - first_time)
+
+    if rate == 0:
+      rate = sum(x.rate() for x in self.batteries) / 3600
+
+    if rate == 0:
+      return None
+
+    left = now if status == 'Discharging' else full - now
+    return left / rate
+
+  def update(self):
+    if self.batteries is None:
+      self.batteries = find_batteries(self.root)
+
+    if not self.batteries:
+      return ''
+
+    try:
+      statuses = [x.status() for x in self.batteries]
+    except OSError:
+      # The battery was removed, look for them again next time
+      self.batteries = None
+      return ''
+
+    now = sum(x.now() for x in self.batteries)
+    full = sum(x.full() for x in self.batteries)
+
+    if full > 0:
+      percent = now * 100 // full
+    else:
+      percent = self.batteries[0].read_int('capacity')
+
+    status = 'Discharging' if 'Discharging' in statuses else \
+             'Charging' if 'Charging' in statuses else statuses[0]
+
+    seconds = self.time_left(status, now, full)
+    self.status = status
+    duration = format_duration(seconds) if seconds is not None else ''
+
+    icon = ''
+    discharging = status == 'Discharging'
+
+    if percent < 20:
+      color = '#BB0000'
+      if discharging:
+        icon = ''
+    elif percent < 50:
+      color = '#BBBB00'
+      if discharging:
+        icon = ''
+    else:
+      color = '#00BB00'
+      if discharging:
+        icon = ''
+
+    return '<span color="%s">%s %d%%%s</span>' % (color, icon, percent,
+                                                  duration)
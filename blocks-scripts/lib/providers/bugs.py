@@ -0,0 +1,143 @@
+"""
+  Checks for certain code words in the i3 log that can indicate errors.
+  If there are any, it shows the number of lines with them as a nicely
+  red colored text. Right clicking the block clears the log.
+
+  Rather than going through the whole log every time, it remembers how
+  far it got and only reads what was added since. It is woken up by
+  inotify when the log changes, falling back to checking it every 30
+  seconds where inotify is not available.
+"""
+import re
+import os
+
+from lib.i3bar import Block
+from lib.inotify import Inotify, IN_MODIFY, IN_CREATE, IN_DELETE, \
+                        IN_MOVED_FROM, IN_MOVED_TO, IN_ATTRIB
+
+LOG_PATH = os.path.expanduser('~/.config/i3/log/i3log')
+
+LISTEN_FOR = re.compile(rb'error|exception', re.IGNORECASE)
+
+# Seconds to wait after the log changed before reading it, so a burst
+# of writes to the log only leads to one update
+CHANGE_DELAY = 1
+
+# Seconds to show that the log was cleared
+CLEARED_DELAY = 5
+
+class LogWatcher():
+  """
+    Counts the lines in a file that match `pattern`, reading only the
+    bytes that were added since the last `check`. It starts over when
+    the file is truncated or replaced by a new one (rotated).
+  """
+  def __init__(self, path, pattern=LISTEN_FOR):
+    self.path = path
+    self.pattern = pattern
+    self.reset(None)
+
+  def reset(self, inode):
+    self.inode = inode
+    self.offset = 0
+    self.count = 0
+    self.partial = b''
+
+  def check(self):
+    """Returns the number of matching lines in the file"""
+    try:
+      stat = os.stat(self.path)
+    except OSError:
+      self.reset(None)
+      return 0
+
+    if stat.st_ino != self.inode or stat.st_size < self.offset:
+      self.reset(stat.st_ino)
+
+    if stat.st_size > self.offset:
+      with open(self.path, 'rb') as f:
+        f.seek(self.offset)
+        data = f.read()
+
+      self.offset += len(data)
+      lines = (self.partial + data).split(b'\n')
+      self.partial = lines.pop()
+      self.count += sum(1 for x in lines if self.pattern.search(x))
+
+    # A line that is not finished yet is counted, but only once it
+    # is finished is it added to the count for good
+    if self.partial and self.pattern.search(self.partial):
+      return self.count + 1
+    return self.count
+
+class BugsBlock(Block):
+  """Block with the number of lines with errors in the i3 log"""
+  interval = 30
+
+  def __init__(self, name, path=LOG_PATH, **properties):
+    Block.__init__(self, name, **properties)
+    self.path = path
+    self.watcher = LogWatcher(path)
+    self.inotify = None
+    self.pending = False
+    self.cleared = False
+
+  def start(self, bar):
+    Block.start(self, bar)
+
+    # The directory is watched rather than the file,
+    # so we also notice when the log is rotated
+    try:
+      self.inotify = Inotify()
+      self.inotify.add_watch(os.path.dirname(self.path),
+                             IN_MODIFY | IN_ATTRIB | IN_CREATE | IN_DELETE |
+                             IN_MOVED_FROM | IN_MOVED_TO)
+    except OSError:
+      if self.inotify is not None:
+        self.inotify.close()
+      self.inotify = None
+      return
+
+    bar.loop.add_reader(self.inotify.fd, self.on_change)
+    self.interval = None
+
+  def on_change(self):
+    """Called when something in the log directory changed"""
+    self.inotify.read()
+
+    if not self.pending:
+      self.pending = True
+      self.bar.loop.call_later(CHANGE_DELAY, self.on_change_done)
+
+  def on_change_done(self):
+    self.pending = False
+    self.refresh()
+
+  def on_cleared_done(self):
+    self.cleared = False
+    self.refresh()
+
+  def update(self):
+    if self.cleared:
+      return '<span color="#00CC00"> cleared!</span>'
+
+    num_lines = self.watcher.check()
+
+    if num_lines > 0:
+      return '<span color="#fc2f2f"> %d</span>' % num_lines
+    return ''
+
+  def on_click(self, event):
+    """Clears the log when right clicked"""
+    if event.get('button') != 3:
+      return None
+
+    if os.path.isfile(self.path):
+      open(self.path, 'w').close()
+      self.watcher.reset(self.watcher.inode)
+
+    self.cleared = True
+    if self.bar is not None:
+      self.bar.loop.call_later(CLEARED_DELAY, self.on_cleared_done)
+
+    return self.update()
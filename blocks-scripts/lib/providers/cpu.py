@@ -0,0 +1,28 @@
+"""
+  Shows the CPU usage since the last update, colored red above
+  75% and yellow above 30%.
+"""
+import math
+
+from lib.i3bar import Block
+from lib.sysinfo import CpuSampler
+
+class CpuBlock(Block):
+  """Block with the total CPU usage in percent"""
+  interval = 10
+
+  def __init__(self, name, **properties):
+    Block.__init__(self, name, **properties)
+    self.sampler = CpuSampler()
+
+  def update(self):
+    usage = math.ceil(self.sampler.sample()['cpu'])
+
+    if usage > 75:
+      color = '#fc2f2f'
+    elif usage > 30:
+      color = '#e67e22'
+    else:
+      return '<span> %2d%%</span>' % usage
+
+    return '<span color="%s"> %2d%%</span>' % (color, usage)
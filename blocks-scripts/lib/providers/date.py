@@ -0,0 +1,24 @@
+"""
+  Shows the current date and time. Clicking it opens the calendar
+  window at the position of the click, through the popup-server
+  if it is running.
+"""
+import asyncio
+import time
+
+from lib.i3bar import Block
+from lib.popups import show_popup_async
+
+class DateBlock(Block):
+  """Block with the date and time in the format `2017-01-31 13:37`"""
+  interval = 15
+
+  def update(self):
+    return time.strftime('%Y-%m-%d %H:%M ')
+
+  def on_click(self, event):
+    if event.get('button') == 1:
+      asyncio.ensure_future(show_popup_async(
+          'calendar', event.get('x'), event.get('y')))
+
+    return None
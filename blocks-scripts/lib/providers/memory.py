@@ -0,0 +1,34 @@
+"""
+  Shows the used memory together with how much of the total it is,
+  colored red above 75% and yellow above 50%.
+"""
+from lib.i3bar import Block
+from lib.sysinfo import MemorySampler
+
+class MemoryBlock(Block):
+  """Block with the used memory in MB or GB and in percent"""
+  interval = 5
+
+  def __init__(self, name, **properties):
+    Block.__init__(self, name, **properties)
+    self.sampler = MemorySampler()
+
+  def update(self):
+    used, total = self.sampler.sample()
+    used = used // 1024
+    percent = used / (total // 1024) * 100
+
+    if used > 1000:
+      used = '%0.2f GB' % (used / 1000)
+    else:
+      used = '%d MB' % used
+
+    if percent > 75:
+      color = '#fc2f2f'
+    elif percent > 50:
+      color = '#e67e22'
+    else:
+      return '<span> %s (%0.2f%%)</span>' % (used, percent)
+
+    return '<span color="%s"> %s (%0.2f%%)</span>' % (color, used,
+                                                             percent)
@@ -0,0 +1,26 @@
+"""
+  Shows the number of windows in the scratchpad, with a red background
+  if one of them is urgent. The number is updated as soon as i3 reports
+  a window event that changes it.
+"""
+from lib.i3bar import Block
+from lib.scratchpad import ScratchpadCounter, format_scratchpad
+
+class ScratchpadBlock(Block):
+  """Block with the number of scratchpad windows"""
+  def __init__(self, name, **properties):
+    Block.__init__(self, name, **properties)
+    self.text = ''
+    self.counter = ScratchpadCounter(self.on_count)
+
+  def start(self, bar):
+    Block.start(self, bar)
+    self.counter.start()
+
+  def on_count(self, num_windows, is_urgent):
+    """Called from the thread of the counter when the number changes"""
+    self.text = format_scratchpad(num_windows, is_urgent) or ''
+    self.bar.refresh_threadsafe(self)
+
+  def update(self):
+    return self.text
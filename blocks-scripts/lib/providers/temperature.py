@@ -0,0 +1,91 @@
+"""
+  Shows the average core temperature of the system. Above 50 C it is
+  colored yellow, above 75 red.
+
+  The temperatures are read from the hwmon sensors in sysfs, the same
+  place `sensors` reads them from. Which files to read is found once,
+  after that an update is just one small read per core.
+"""
+import glob
+import os
+
+from lib.i3bar import Block
+
+HWMON_PATH = '/sys/class/hwmon'
+
+# Drivers for CPU sensors, used if none of the sensors are labeled
+# as cores, which is what `coretemp` does
+CPU_DRIVERS = ['coretemp', 'k10temp', 'zenpower']
+
+def read_file(path):
+  with open(path) as f:
+    return f.read().strip()
+
+def find_core_sensors(root=HWMON_PATH):
+  """
+    Returns the paths to the `temp*_input` files of the CPU cores. These
+    are the ones labeled `Core N`, or all the sensors of a CPU driver if
+    none are labeled like that.
+  """
+  cores = []
+  cpus = []
+
+  for hwmon in sorted(glob.glob(os.path.join(root, 'hwmon*'))):
+    try:
+      driver = read_file(os.path.join(hwmon, 'name'))
+    except OSError:
+      continue
+
+    for path in sorted(glob.glob(os.path.join(hwmon, 'temp*_input'))):
+      try:
+        label = read_file(path.replace('_input', '_label'))
+      except OSError:
+        label = ''
+
+      if label.startswith('Core'):
+        cores.append(path)
+      elif driver in CPU_DRIVERS:
+        cpus.append(path)
+
+  return cores or cpus
+
+class TemperatureBlock(Block):
+  """Block with the average temperature of the CPU cores"""
+  interval = 5
+
+  def __init__(self, name, root=HWMON_PATH, **properties):
+    Block.__init__(self, name, **properties)
+    self.root = root
+    self.sensors = None
+
+  def get_average_temperature(self):
+    """Returns the average core temperature or None if there are no cores"""
+    if self.sensors is None:
+      self.sensors = find_core_sensors(self.root)
+
+    if not self.sensors:
+      return None
+
+    try:
+      temperatures = [int(read_file(x)) // 1000 for x in self.sensors]
+    except (OSError, ValueError):
+      # The sensors moved, which happens when drivers are reloaded
+      self.sensors = None
+      return None
+
+    return sum(temperatures) // len(temperatures)
+
+  def update(self):
+    temperature = self.get_average_temperature()
+
+    if temperature is None:
+      return ''
+
+    if temperature > 75:
+      color, icon = '#fc2f2f', ''
+    elif temperature > 50:
+      color, icon = '#e67e22', ''
+    else:
+      return '<span>%3d°C</span>' % temperature
+
+    return '<span color="%s">%s%3d°C</span>' % (color, icon, temperature)
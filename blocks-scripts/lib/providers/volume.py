@@ -0,0 +1,122 @@
+"""
+  Shows the volume of a mixer control, Master or Capture, the same way
+  the volume script does. Scrolling changes the volume by STEP percent
+  and right clicking mutes it.
+
+  The mixer is kept open through lib.alsa and both blocks are updated
+  when it reports a change, so the bar follows the media keys and other
+  programs right away without polling. Where libasound can not be used,
+  or the card goes away while running, it falls back to amixer, which is
+  then run once for each update and change, and the block is only
+  updated on clicks and when signalled.
+"""
+import subprocess
+import re
+
+from lib.i3bar import Block
+from lib.alsa import Mixer
+
+# Percent to change the volume by when scrolling
+STEP = 2
+
+VOLUME_PATTERN = re.compile(r'\[(\d{1,3})%\]')
+SWITCH_PATTERN = re.compile(r'\[(on|off)\]')
+
+# The blocks of the same card share the mixer
+mixers = {}
+
+def get_mixer(card):
+  if card not in mixers:
+    mixers[card] = Mixer(card)
+  return mixers[card]
+
+def parse_amixer(output):
+  """Returns the volume and whether it is on from the output of amixer"""
+  volume = VOLUME_PATTERN.search(output)
+  switch = SWITCH_PATTERN.search(output)
+
+  return (int(volume.group(1)) if volume else 0,
+          switch is None or switch.group(1) == 'on')
+
+class AmixerControl():
+  """
+    A control changed through amixer, for when libasound can not be
+    used. `amixer set` prints the new state, so a change needs a single
+    run of it rather than reading the volume before setting it
+  """
+  def __init__(self, name, card='default'):
+    self.name = name
+    self.command = ['amixer', '-D', card]
+
+  def run(self, *args):
+    try:
+      return subprocess.run(self.command + list(args),
+                            stdout=subprocess.PIPE,
+                            stderr=subprocess.DEVNULL).stdout.decode('utf-8')
+    except OSError:
+      return ''
+
+  def read(self):
+    return parse_amixer(self.run('get', self.name))
+
+  def change(self, step):
+    return parse_amixer(self.run('set', self.name,
+                                 '%d%%%s' % (abs(step), '-+'[step > 0])))
+
+  def toggle(self):
+    return parse_amixer(self.run('set', self.name, 'toggle'))
+
+def format_volume(control, volume, on):
+  """Formats the volume as a pango string, like the volume script"""
+  if on and control == 'Master':
+    return '<span> %d%%</span>' % volume
+  elif on:
+    return '<span color=\'#FF0000\'> 0%</span>'
+  elif control == 'Master':
+    return '<span color=\'#FF0000\'> %d%%</span>' % volume
+  return '<span> %d%%</span>' % volume
+
+class VolumeBlock(Block):
+  """Block with the volume of the mixer control `control`"""
+  def __init__(self, name, control='Master', card='default', step=STEP,
+               **properties):
+    Block.__init__(self, name, **properties)
+    self.control = control
+    self.card = card
+    self.step = step
+    self.mixer = None
+
+  def start(self, bar):
+    Block.start(self, bar)
+
+    try:
+      mixer = get_mixer(self.card)
+      self.mixer = mixer.element(self.control)
+      mixer.watch(bar.loop, self.refresh, self.on_mixer_lost)
+    except OSError:
+      self.mixer = AmixerControl(self.control, self.card)
+
+  def on_mixer_lost(self, mixer):
+    """Falls back to amixer when the card of the mixer went away"""
+    if mixers.get(self.card) is mixer:
+      del mixers[self.card]
+
+    self.mixer = AmixerControl(self.control, self.card)
+    self.refresh()
+
+  def update(self):
+    return format_volume(self.control, *self.mixer.read())
+
+  def on_click(self, event):
+    button = event.get('button')
+
+    if button == 3:
+      state = self.mixer.toggle()
+    elif button == 4:
+      state = self.mixer.change(self.step)
+    elif button == 5:
+      state = self.mixer.change(-self.step)
+    else:
+      return None
+
+    return format_volume(self.control, *state)
@@ -0,0 +1,126 @@
+"""
+  Helpers for dealing with the windows in the i3 scratchpad.
+
+  i3 keeps the scratchpad as a workspace called `__i3_scratch` in the
+  content of its hidden `__i3` output, so it is found by following that
+  path down from the root instead of searching the whole tree.
+
+  ScratchpadCounter counts the scratchpad windows once and then keeps
+  the count up to date by listening to window events from i3, so the
+  bar can show changes straight away.
+"""
+import threading
+import logging
+import struct
+import time
+
+import i3ipc
+
+SCRATCHPAD_OUTPUT = '__i3'
+SCRATCHPAD_WORKSPACE = '__i3_scratch'
+
+# Seconds to wait before connecting to i3 again, after losing it
+RECONNECT_DELAY = 5
+
+# Window events that can move a window in or out of the scratchpad.
+# These are rare compared to focus and title changes
+RECOUNT_EVENTS = ['new', 'move', 'floating']
+
+log = logging.getLogger(__name__)
+
+def find_scratchpad(root):
+  """Returns the scratchpad workspace of the tree, or None if there is none"""
+  for output in root.nodes:
+    if output.name != SCRATCHPAD_OUTPUT:
+      continue
+
+    for content in output.nodes:
+      for workspace in content.nodes:
+        if workspace.name == SCRATCHPAD_WORKSPACE:
+          return workspace
+
+  return None
+
+def get_scratchpad_windows(root):
+  """Returns the windows in the scratchpad of the tree"""
+  scratchpad = find_scratchpad(root)
+
+  if scratchpad is None:
+    return []
+
+  return [x for x in scratchpad.descendents() if x and x.name]
+
+class ScratchpadCounter():
+  """
+    Keeps track of the number of windows in the scratchpad and whether
+    any of them are urgent. `callback(num_windows, is_urgent)` is called
+    from the thread started by `start` whenever either changes.
+  """
+  def __init__(self, callback):
+    self.callback = callback
+    self.windows = {}
+    self.state = None
+    self.i3 = None
+
+  def recount(self):
+    """Counts the windows in the scratchpad from the tree"""
+    self.windows = {x.id: x.urgent
+                    for x in get_scratchpad_windows(self.i3.get_tree())}
+
+  def on_window(self, i3, event):
+    """Updates the count from a window event"""
+    container = event.container
+
+    if event.change in RECOUNT_EVENTS:
+      self.recount()
+    elif event.change == 'close':
+      self.windows.pop(container.id, None)
+    elif event.change == 'urgent' and container.id in self.windows:
+      self.windows[container.id] = container.urgent
+    else:
+      return
+
+    self.notify()
+
+  def notify(self):
+    """Calls the callback if the count or urgency changed"""
+    state = (len(self.windows), any(self.windows.values()))
+
+    if state != self.state:
+      self.state = state
+      self.callback(*state)
+
+  def run(self):
+    """Counts and listens for window events, reconnecting if i3 restarts"""
+    while True:
+      try:
+        self.i3 = i3ipc.Connection()
+        self.i3.on('window', self.on_window)
+        self.recount()
+        self.notify()
+        self.i3.main()
+      except (OSError, struct.error):
+        # i3 went away, or it cut a reply short while restarting
+        pass
+      except Exception:
+        log.exception('Unable to count the scratchpad windows')
+
+      time.sleep(RECONNECT_DELAY)
+
+  def start(self):
+    """Runs the counter in a background thread"""
+    thread = threading.Thread(target=self.run)
+    thread.daemon = True
+    thread.start()
+    return thread
+
+def format_scratchpad(num_windows, is_urgent):
+  """
+    Returns the block for the number of scratchpad windows as an
+    i3bar object, or None if there are no windows
+  """
+  if num_windows == 0:
+    return None
+  elif is_urgent:
+    return {'background': '#f9422d', 'full_text': ' %s' % num_windows}
+  return {'full_text': ' %s' % num_windows}
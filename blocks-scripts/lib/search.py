@@ -0,0 +1,152 @@
+"""
+  This module defines the index used to filter the completion menu.
+  A string matches a query if every word of the query is found
+  somewhere in it, not caring about case. So the query `in dead ships`
+  matches `In Flames - Where the Dead Ships Dwell`.
+
+  Rather than lowercasing and checking every string on every keypress,
+  the strings are lowercased once and split into tokens on whitespace.
+  Since a query word can never contain whitespace, it can only be found
+  inside a single token, so the index only has to look for the word
+  among the unique tokens and can then look up which strings have them.
+
+  Most of the time a new query just extends the previous one (the user
+  typed another character), in which case only the previous matches
+  have to be checked again.
+
+  The index can be filtered from a different thread than the one
+  updating it, and a filter can be cancelled half way through by
+  giving it an `is_cancelled` function.
+"""
+import threading
+import bisect
+import re
+
+# When there are fewer candidates than this left, it is faster to check
+# the remaining words against the strings than to look them up
+SCAN_LIMIT = 2000
+
+# How many strings or tokens to go through between checking
+# whether the filter has been cancelled
+CANCEL_CHECK_INTERVAL = 1024
+
+class SearchCancelled(Exception):
+  """Raised inside the index when a filter has been cancelled"""
+
+class SearchIndex():
+  """
+    Index over a list of strings, which can be filtered with `filter`
+  """
+  def __init__(self, elements=()):
+    self.lock = threading.Lock()
+    self.update(elements)
+
+  def update(self, elements):
+    """Builds the index over a new list of strings"""
+    with self.lock:
+      self._build(elements)
+
+  def _build(self, elements):
+    self.elements = list(elements)
+    self.lowered = [x.lower() for x in self.elements]
+
+    postings = {}
+    for i, element in enumerate(self.lowered):
+      for token in set(element.split()):
+        postings.setdefault(token, []).append(i)
+
+    # All the unique tokens are joined into one string so a word can
+    # be found in all of them with a single search. `starts` holds
+    # the offset of each token, to find the token from a match
+    self.tokens = list(postings)
+    self.postings = [postings[x] for x in self.tokens]
+    self.starts = []
+    offset = 0
+    for token in self.tokens:
+      self.starts.append(offset)
+      offset += len(token) + 1
+    self.text = '\n'.join(self.tokens)
+
+    self.previous_words = []
+    self.previous_matches = list(range(len(self.elements)))
+
+  def _lookup(self, word, is_cancelled):
+    """Returns the set of indexes of the strings that contain `word`"""
+    found = set()
+    token_ids = set()
+
+    for n, match in enumerate(re.finditer(re.escape(word), self.text)):
+      if n % CANCEL_CHECK_INTERVAL == 0 and is_cancelled():
+        raise SearchCancelled()
+
+      token_id = bisect.bisect_right(self.starts, match.start()) - 1
+      if token_id not in token_ids:
+        token_ids.add(token_id)
+        found.update(self.postings[token_id])
+
+    return found
+
+  def _narrows(self, words):
+    """
+      Checks whether `words` can only match a subset of what the previous
+      words matched, which is the case if every previous word is
+      contained in one of the new ones
+    """
+    return all(any(old in new for new in words)
+               for old in self.previous_words)
+
+  def _scan(self, word, candidates, is_cancelled):
+    """Returns the `candidates` whose strings contain `word`"""
+    lowered = self.lowered
+    found = []
+
+    for start in range(0, len(candidates), CANCEL_CHECK_INTERVAL):
+      if is_cancelled():
+        raise SearchCancelled()
+      found.extend(i
+                   for i in candidates[start:start + CANCEL_CHECK_INTERVAL]
+                   if word in lowered[i])
+
+    return found
+
+  def _search(self, words, is_cancelled, candidates=None):
+    """
+      Returns the sorted indexes of the strings matching all `words`,
+      only looking among `candidates` if given
+    """
+    # Longer words tend to match fewer strings, so start with those
+    for word in sorted(set(words), key=len, reverse=True):
+      if candidates is not None and len(candidates) < SCAN_LIMIT:
+        # The candidates can be the set a lookup gave
+        candidates = self._scan(word, sorted(candidates), is_cancelled)
+      elif candidates is None:
+        candidates = self._lookup(word, is_cancelled)
+      else:
+        candidates = self._lookup(word, is_cancelled).intersection(candidates)
+
+    return sorted(candidates)
+
+  def filter(self, text, is_cancelled=None):
+    """
+      Returns the strings that contain every word of `text`. If
+      `is_cancelled` is given, it is called every now and then and
+      the filter gives up and returns None once it returns true.
+    """
+    words = text.lower().split()
+    is_cancelled = is_cancelled or (lambda: False)
+
+    with self.lock:
+      try:
+        if not words:
+          matches = list(range(len(self.elements)))
+        elif self._narrows(words):
+          matches = self._search(words, is_cancelled, self.previous_matches)
+        else:
+          matches = self._search(words, is_cancelled)
+      except SearchCancelled:
+        return None
+
+      self.previous_words = words
+      self.previous_matches = matches
+
+      return [self.elements[i] for i in matches]
@@ -0,0 +1,96 @@
+"""
+  This module reads CPU and memory usage straight from /proc, which
+  is what `top` and `free` do as well, just without starting them.
+
+  The CPU counters in /proc/stat only ever go up, so the usage is the
+  difference since the previous read. The sampler keeps the previous
+  counters around, so each read gives the usage since the last one
+  straight away, without having to sleep through a sampling window.
+"""
+
+class CpuSampler():
+  """
+    Gives the CPU usage in percent since the previous sample, both for
+    all CPUs together (`cpu`) and for each core (`cpu0`, `cpu1`, ...).
+    The first sample gives the usage since boot.
+  """
+  def __init__(self, path='/proc/stat'):
+    self.path = path
+    self.previous = {}
+
+  def read(self):
+    """
+      Reads the counters, returning a dictionary from the name of
+      the CPU to a tuple of (idle, total) time
+    """
+    counters = {}
+
+    with open(self.path) as f:
+      for line in f:
+        if not line.startswith('cpu'):
+          break
+
+        fields = line.split()
+        # user, nice, system, idle, iowait, irq, softirq, steal. Guest
+        # time is already counted in user and nice. iowait is counted
+        # as used, the same as `top` does
+        times = [int(x) for x in fields[1:9]]
+        counters[fields[0]] = (times[3], sum(times))
+
+    return counters
+
+  def sample(self):
+    """Returns the usage of each CPU in percent since the last sample"""
+    counters = self.read()
+    usage = {}
+
+    for name, (idle, total) in counters.items():
+      prev_idle, prev_total = self.previous.get(name, (0, 0))
+      diff_total = total - prev_total
+
+      if diff_total <= 0:
+        usage[name] = 0.0
+      else:
+        usage[name] = 100 * (1 - (idle - prev_idle) / diff_total)
+
+    self.previous = counters
+    return usage
+
+class MemorySampler():
+  """
+    Gives the memory usage from /proc/meminfo, counting used memory the
+    same way as `free`, which is everything that is not available. On
+    kernels without MemAvailable, it is everything that is not free,
+    buffers or cache.
+  """
+  def __init__(self, path='/proc/meminfo'):
+    self.path = path
+
+  def read(self):
+    """Returns the fields of /proc/meminfo in kB"""
+    fields = {}
+
+    with open(self.path) as f:
+      for line in f:
+        key, _, value = line.partition(':')
+        fields[key] = int(value.split()[0])
+
+    return fields
+
+  def sample(self):
+    """Returns a tuple of (used, total) memory in kB"""
+    fields = self.read()
+    total = fields['MemTotal']
+
+    if 'MemAvailable' in fields:
+      return total - fields['MemAvailable'], total
+
+    cache = fields.get('Cached', 0) + fields.get('SReclaimable', 0)
+    used = total - fields['MemFree'] - fields.get('Buffers', 0) - cache
+
+    # Like `free`, fall back to not counting the cache
+    # if that makes the number go negative
+    if used < 0:
+      used = total - fields['MemFree']
+
+    return used, total
@@ -1,4 +1,12 @@
 #!/usr/bin/python3.5
+import time
+import os
+
+# With BLOCKS_WINDOW_TIMING set, the time it takes to import this,
+# to create the window and to get it on the screen is written to stderr
+TIMING = bool(os.environ.get('BLOCKS_WINDOW_TIMING'))
+IMPORT_START = time.perf_counter()
+
 import gi
 gi.require_version('Gtk', '3.0')
 
@@ -9,10 +17,9 @@ from gi.repository import GObject
 import sys
 import signal
 
-LEN_ARGS = len(sys.argv)
-POSITION_X = int(sys.argv[1]) if LEN_ARGS > 1 else None
-POSITION_Y = int(sys.argv[2]) if LEN_ARGS > 2 else None
-BAR_HEIGHT = int(sys.argv[3]) if LEN_ARGS > 3 else 15
+from lib.metrics import observe
+
+DEFAULT_BAR_HEIGHT = 15
 
 # This css is used mainly by music-control but
 # I may keep adding to it and its nice to have
@@ -37,13 +44,77 @@ css = """
 }
 """
 
-style_provider = Gtk.CssProvider()
-style_provider.load_from_data(str.encode(css))
-Gtk.StyleContext.add_provider_for_screen(
-  Gdk.Screen.get_default(),
-  style_provider,
-  Gtk.STYLE_PROVIDER_PRIORITY_APPLICATION
-)
+# Added when the first window is made, rather than when importing
+style_provider = None
+
+# The workarea of each monitor that a window was rendered on. Cleared
+# when the monitors or the size of the screen change
+geometry_cache = {}
+
+def report_timing(name, seconds):
+  """
+    Writes how long `name` took to stderr, if timing is enabled,
+    and records it in the metrics
+  """
+  observe('window.' + name.replace(' ', '_'), seconds)
+  if TIMING:
+    print('lib.window: %s took %.1fms' % (name, seconds * 1000),
+          file=sys.stderr)
+
+def parse_args(argv=None):
+  """
+    Returns the position and bar height that the script was given as
+    arguments. The position is None if it was not given
+  """
+  argv = sys.argv if argv is None else argv
+  x = int(argv[1]) if len(argv) > 1 else None
+  y = int(argv[2]) if len(argv) > 2 else None
+  bar_height = int(argv[3]) if len(argv) > 3 else DEFAULT_BAR_HEIGHT
+
+  return x, y, bar_height
+
+def setup_display(display):
+  """
+    Adds the css for the windows and starts watching the monitors.
+    This only needs to be done once, when the first window is made
+  """
+  global style_provider
+
+  if style_provider is not None:
+    return
+
+  screen = display.get_default_screen()
+
+  style_provider = Gtk.CssProvider()
+  style_provider.load_from_data(str.encode(css))
+  Gtk.StyleContext.add_provider_for_screen(
+    screen,
+    style_provider,
+    Gtk.STYLE_PROVIDER_PRIORITY_APPLICATION
+  )
+
+  display.connect('monitor-added', clear_geometry_cache)
+  display.connect('monitor-removed', clear_geometry_cache)
+  screen.connect('monitors-changed', clear_geometry_cache)
+  screen.connect('size-changed', clear_geometry_cache)
+
+def clear_geometry_cache(*args):
+  geometry_cache.clear()
+
+def get_geometry(display, x=None, y=None):
+  """
+    Returns the position to render at, the monitor of it and the workarea
+    of the monitor. The workarea is looked up once for each monitor, as
+    the clicks hardly ever land on the same position twice
+  """
+  x, y = get_window_position(display, x, y)
+  monitor = display.get_monitor_at_point(x, y)
+
+  workarea = geometry_cache.get(monitor)
+  if workarea is None:
+    workarea = geometry_cache[monitor] = monitor.get_workarea()
+
+  return x, y, monitor, workarea
 
 def get_window_position_by_args(display):
   """
@@ -51,8 +122,16 @@ def get_window_position_by_args(display):
     if not it will find the primary monitor and the middle of that
     as the position
   """
-  if POSITION_X is not None and POSITION_Y is not None:
-    return POSITION_X, POSITION_Y
+  x, y, _ = parse_args()
+  return get_window_position(display, x, y)
+
+def get_window_position(display, x=None, y=None):
+  """
+    Returns `x` and `y` if both are given, if not the middle of
+    the primary monitor
+  """
+  if x is not None and y is not None:
+    return x, y
 
   primary_monitor = display.get_primary_monitor()
   workarea = primary_monitor.get_workarea()
@@ -86,15 +165,22 @@ class BlocksWindow(Gtk.Window):
 
     If no coordinates are given, it will find the middle of the primary monitor
     and place it there (though low on the monitor)
+
+    A window with `persistent` set is hidden instead of exiting, so it can
+    be shown again with `popup`. The popup-server uses this to keep the
+    windows ready.
   """
 
   def __init__(self, width=200, height=100):
+    init_start = time.perf_counter()
 
     Gtk.Window.__init__(self)
-    display = Gdk.Display.get_default()
+    setup_display(Gdk.Display.get_default())
 
     # Get the absolute coordinates and bar height from arguments
-    self.x, self.y = get_window_position_by_args(display)
+    x, y, self.bar_height = parse_args()
+    self.persistent = False
+    self.last_size = None
 
     self.width = width
     self.height = height
@@ -112,16 +198,44 @@ class BlocksWindow(Gtk.Window):
     # Retrive information about the current monitor that
     # the window will be shown on as these are used everytime
     # the window resizes.
-    self.monitor = display.get_monitor_at_point(self.x, self.y)
-    self.workarea = self.monitor.get_workarea()
+    self.move_to(x, y)
 
-    self.connect("delete-event", Gtk.main_quit)
+    self.connect("delete-event", self.on_delete)
     self.connect("check_resize", self.on_resize)
     self.connect('leave-notify-event', self.on_leave)
 
     # if control-c is pressed, we also exit
     signal.signal(signal.SIGINT, signal.SIG_DFL)
 
+    if TIMING:
+      self.map_start = init_start
+      self.map_handler = self.connect('map-event', self.on_first_map)
+      report_timing('init', time.perf_counter() - init_start)
+
+  def move_to(self, x=None, y=None):
+    """
+      Makes the window render at `x` and `y`, like the arguments would
+    """
+    self.x, self.y, self.monitor, self.workarea = get_geometry(
+      Gdk.Display.get_default(), x, y)
+
+  def popup(self, x=None, y=None):
+    """
+      Shows the window again at `x` and `y`
+    """
+    self.move_to(x, y)
+    self.show()
+    self.present()
+
+  def close_popup(self):
+    """
+      Closes the window, which only hides it if it is `persistent`
+    """
+    if self.persistent:
+      self.hide()
+    else:
+      Gtk.main_quit()
+
   def show(self):
     """
       This overrides the default show as it requires it to also set
@@ -141,7 +255,7 @@ class BlocksWindow(Gtk.Window):
 
     return top_x < x and bottom_x > x and top_y < y and bottom_y > y
 
-  def find_optimal_position(self):
+  def find_optimal_position(self, rect=None):
     """
       Tries to find the optimal position for the window on the monitor
       that it was told to render on.
@@ -150,13 +264,14 @@ class BlocksWindow(Gtk.Window):
       the mouse click happened, but when doing so, it will make sure
       to take the monitor size into consideration.
     """
-    rect = self.get_allocation()
+    rect = rect or self.get_allocation()
 
     x = min(self.workarea.width - rect.width / 2, self.x - self.workarea.x)
-    y = min(self.workarea.height, self.y - self.workarea.y) - BAR_HEIGHT - 5
+    y = min(self.workarea.height, self.y - self.workarea.y) - \
+        self.bar_height - 5
 
     if y - rect.height < 0:
-      y = rect.height + BAR_HEIGHT + 10
+      y = rect.height + self.bar_height + 10
 
     return self.workarea.x + x, self.workarea.y + y
 
@@ -165,7 +280,7 @@ class BlocksWindow(Gtk.Window):
       Returns the position of the window
     """
     rect = self.get_allocation()
-    x, y = self.find_optimal_position()
+    x, y = self.find_optimal_position(rect)
     return (x - rect.width / 2, y - rect.height)
 
   def set_position(self, x=None, y=None):
@@ -177,11 +292,30 @@ class BlocksWindow(Gtk.Window):
 
     self.move(x, y)
 
+  def on_delete(self, widget, event):
+    """ Handles the window being closed, which does not destroy it
+        if it is `persistent`
+    """
+    self.close_popup()
+    return self.persistent
+
   def on_resize(self, _):
     """ Handles resizing events, which will happen even though the user
-        isnt allowed to resize the window
+        isnt allowed to resize the window. These happen a lot more often
+        than the size actually changes, so it only moves when it did
     """
-    self.set_position()
+    rect = self.get_allocation()
+    size = (rect.width, rect.height)
+
+    if size != self.last_size:
+      self.last_size = size
+      self.set_position()
+
+  def on_first_map(self, widget, event):
+    """ Reports how long it took for the window to get on the screen
+    """
+    report_timing('first map', time.perf_counter() - self.map_start)
+    self.disconnect(self.map_handler)
 
   def on_leave(self, widget, event):
     """ Handles on leave events. On leave events happen quite often and
@@ -204,4 +338,6 @@ class BlocksWindow(Gtk.Window):
     is_leave_notify = event.detail == Gdk.NotifyType.NONLINEAR
 
     if is_leave_notify and not self.is_inside_window(event.x_root, event.y_root):
-      Gtk.main_quit()
+      self.close_popup()
+
+report_timing('import', time.perf_counter() - IMPORT_START)
@@ -2,26 +2,31 @@
 
 STEP=5
 UNIT="%" 
-VOLUME=$(amixer get Master | grep "Playback.*\[.*%\]" | head -1 | awk '{print $4;}' | tr -d "\[\]")
-STATE=$(amixer get Master | grep 'Mono:' | awk '{print $6}' | tr -d "\[\]")
-SETVOL="/usr/bin/amixer -q -D pulse set Master"
+SETVOL="/usr/bin/amixer -D pulse set Master"
 DIRECTION=$1
 
+# amixer prints the new state after setting it,
+# so there is no need to ask for it again
 case "$1" in
     "up")
-          $SETVOL $STEP$UNIT+
+          OUTPUT=$($SETVOL $STEP$UNIT+)
           ;;
   "down")
-          $SETVOL $STEP$UNIT-
+          OUTPUT=$($SETVOL $STEP$UNIT-)
           ;;
   "mute")
-          $SETVOL toggle
+          OUTPUT=$($SETVOL toggle)
+          ;;
+       *)
+          OUTPUT=$(/usr/bin/amixer -D pulse get Master)
           ;;
 esac
 
+[[ $OUTPUT =~ \[([0-9]+)%\] ]] && VOLUME=${BASH_REMATCH[1]}
+
 # Show volume with volnoti
-if [[ "$STATE" == "on" ]]; then
-    volnoti-show $VOLUME
+if [[ $OUTPUT == *"[on]"* ]]; then
+    volnoti-show "$VOLUME"
 else
     volnoti-show -m
 fi
@@ -0,0 +1,10 @@
+"""
+  The tests import lib from blocks-scripts, the same way the scripts do,
+  and use the fakes of MPD and i3 from the benchmarks.
+"""
+import sys
+import os
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'blocks-scripts'))
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
@@ -0,0 +1,56 @@
+import asyncio
+import time
+
+import pytest
+
+from fake_mpd import FakeMpd
+from fixtures import make_songs
+from lib.mpd import AsyncMpc, MpdConnectionError
+
+TIMEOUT = 0.3
+DELAY = 1.5
+
+@pytest.fixture
+def servers(tmp_path):
+  healthy = FakeMpd(make_songs(5))
+  slow = FakeMpd(make_songs(5), delay=DELAY)
+  yield {'healthy': healthy.socket_path, 'slow': slow.socket_path,
+         'missing': str(tmp_path / 'missing.sock')}, healthy, slow
+  healthy.close()
+  slow.close()
+
+def test_update(servers):
+  hosts, healthy, slow = servers
+  mpc = AsyncMpc(hosts, timeout=TIMEOUT)
+
+  start = time.monotonic()
+  results = asyncio.run(mpc.update())
+  elapsed = time.monotonic() - start
+
+  # The servers are asked at the same time, so it takes about
+  # one timeout rather than the delay or a timeout each
+  assert elapsed < TIMEOUT * 2 < DELAY
+
+  assert results['healthy']['status'] == 'playing'
+  assert mpc.status['healthy'] is results['healthy']
+
+  assert isinstance(results['slow'], MpdConnectionError)
+  assert 'respond' in str(results['slow'])
+  assert isinstance(results['missing'], MpdConnectionError)
+  assert 'connect' in str(results['missing'])
+  assert mpc.status['slow'] is None
+  assert mpc.status['missing'] is None
+
+def test_command(servers):
+  hosts, healthy, slow = servers
+  mpc = AsyncMpc(hosts, timeout=TIMEOUT)
+
+  start = time.monotonic()
+  results = asyncio.run(mpc.set_volume(30))
+  elapsed = time.monotonic() - start
+
+  assert elapsed < TIMEOUT * 2
+  assert results['healthy'] == []
+  assert healthy.volume == 30
+  assert isinstance(results['slow'], MpdConnectionError)
+  assert isinstance(results['missing'], MpdConnectionError)
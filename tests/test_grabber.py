@@ -0,0 +1,67 @@
+from importlib.machinery import SourceFileLoader
+import importlib.util
+import logging
+import os
+
+import i3ipc
+import pytest
+
+from conftest import ROOT
+from fake_i3 import FakeI3
+
+class FakeReply():
+  """A reply that, like the ones of i3ipc, can not be indexed"""
+  def __init__(self, success):
+    self.success = success
+
+class FakeConnection():
+  def __init__(self, success):
+    self.success = success
+    self.commands = []
+
+  def command(self, command):
+    self.commands.append(command)
+    return [FakeReply(self.success)]
+
+@pytest.fixture
+def i3():
+  i3 = FakeI3(scratchpad_windows=3)
+  yield i3
+  i3.close()
+
+@pytest.fixture
+def grabber(i3, monkeypatch):
+  monkeypatch.setenv('I3SOCK', i3.socket_path)
+  path = os.path.join(ROOT, 'rofi-scratchpad-grabber')
+  loader = SourceFileLoader('rofi_scratchpad_grabber', path)
+  spec = importlib.util.spec_from_loader(loader.name, loader)
+  module = importlib.util.module_from_spec(spec)
+  loader.exec_module(module)
+  return module
+
+def test_show_window(grabber, caplog):
+  grabber.i3 = FakeConnection(True)
+
+  grabber.show_window(10000002)
+
+  assert grabber.i3.commands == \
+      ['[con_id=10000002] scratchpad show, floating toggle']
+  assert not caplog.records
+
+def test_show_window_failed(grabber, caplog):
+  grabber.i3 = FakeConnection(False)
+
+  grabber.show_window(42)
+
+  assert 'Unable to perform' in caplog.text
+
+def test_show_window_through_i3(grabber, i3, caplog):
+  windows, _, _ = grabber.get_scratchpad_windows()
+  grabber.show_window(windows[1].id)
+
+  assert i3.commands[-1] == \
+      '[con_id=%d] scratchpad show, floating toggle' % windows[1].id
+  assert not [x for x in caplog.records if x.levelno >= logging.ERROR]
+
+  grabber.show_window(1)
+  assert 'No window matches' in caplog.text
@@ -0,0 +1,42 @@
+import asyncio
+import io
+import os
+
+from lib.i3bar import Bar, Block
+
+class ClickBlock(Block):
+  def __init__(self, name, **properties):
+    Block.__init__(self, name, **properties)
+    self.clicks = []
+
+  def on_click(self, event):
+    self.clicks.append(event['button'])
+    return 'clicked'
+
+def test_bad_click_lines_are_skipped():
+  read_fd, write_fd = os.pipe()
+  block = ClickBlock('block')
+  loop = asyncio.new_event_loop()
+
+  with os.fdopen(read_fd, 'rb') as input:
+    bar = Bar([block], loop=loop, output=io.StringIO(), input=input)
+    block.start(bar)
+
+    os.write(write_fd, b'[\n'
+                       b'{"name": "block", "button": 1}\n'
+                       b',{"name": "block", "butt\n'
+                       b',[1, 2]\n'
+                       b',{"name": "block", "button": 3}\n'
+                       b',{"name": "block", ')
+    bar.on_input()
+
+    assert block.clicks == [1, 3]
+
+    # The rest of a line comes with the next read
+    os.write(write_fd, b'"button": 4}\n')
+    bar.on_input()
+
+  os.close(write_fd)
+  loop.close()
+
+  assert block.clicks == [1, 3, 4]
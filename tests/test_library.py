@@ -0,0 +1,63 @@
+import logging
+
+import pytest
+
+from fake_mpd import FakeMpd
+from fixtures import make_songs
+from lib.library import Library
+from lib.mpd import MpdClient, song_name
+
+@pytest.fixture
+def songs():
+  return make_songs(200)
+
+@pytest.fixture
+def mpd(songs):
+  mpd = FakeMpd(songs)
+  yield mpd
+  mpd.close()
+
+def changed(songs):
+  """The songs with the title of the first one changed"""
+  songs = [dict(x) for x in songs]
+  songs[0]['Title'] = 'Where The Dead Ships Dwell'
+  return songs
+
+def test_song_name():
+  assert song_name({'file': 'a.flac'}) == 'a.flac'
+  assert song_name({'Artist': 'In Flames', 'Title': 'Alias'}) == \
+      'In Flames - Alias'
+  assert song_name({'Name': 'Radio', 'Title': 'News'}) == 'Radio: News'
+
+def test_refresh(mpd, songs):
+  client = MpdClient(mpd.socket_path)
+  library = Library(':memory:')
+
+  assert library.refresh(client)
+  assert library.count() == len(songs)
+  assert not library.refresh(client)
+  assert mpd.count('listallinfo') == 1
+
+  mpd.update_library(changed(songs))
+
+  assert library.refresh(client)
+  assert mpd.count('listallinfo') == 1
+  assert library.search('dead ships dw')[0]['file'] == songs[0]['file']
+
+def test_refresh_without_db_update(mpd, songs, caplog):
+  mpd.has_db_update = False
+  client = MpdClient(mpd.socket_path)
+  library = Library(':memory:')
+
+  assert library.refresh(client)
+  assert library.count() == len(songs)
+
+  mpd.update_library(changed(songs))
+  with caplog.at_level(logging.INFO, logger='lib.library'):
+    assert library.refresh(client)
+
+  # Only what changed since the first refresh is fetched
+  assert mpd.count('listallinfo') == 1
+  assert mpd.count('find') == 1
+  assert 'db_update' in caplog.text
+  assert library.search('dead ships dw')[0]['file'] == songs[0]['file']
@@ -0,0 +1,135 @@
+import json
+import threading
+
+import pytest
+
+from lib import metrics
+
+@pytest.fixture
+def enabled(tmp_path, monkeypatch):
+  """Turns the metrics on, writing to a file in `tmp_path`"""
+  path = tmp_path / 'metrics.log'
+  monkeypatch.setattr(metrics, 'ENABLED', True)
+  monkeypatch.setattr(metrics, 'PATH', str(path))
+  monkeypatch.setattr(metrics, 'counters', {})
+  monkeypatch.setattr(metrics, 'histograms', {})
+  monkeypatch.setattr(metrics, 'last_flush', metrics.time.monotonic())
+  return path
+
+def test_buckets():
+  assert metrics.bucket_of(0) == 0
+  assert metrics.bucket_of(0.0000005) == 0
+
+  for seconds in (0.000001, 0.00003, 0.0042, 0.5, 3):
+    bucket = metrics.bucket_of(seconds)
+    assert metrics.bucket_limit(bucket - 1) <= seconds
+    assert seconds < metrics.bucket_limit(bucket) * 1.0001
+
+def test_percentile():
+  histogram = [0, 0.0, 0.0, {}]
+  for seconds in [0.001] * 90 + [0.1] * 10:
+    bucket = metrics.bucket_of(seconds)
+    histogram[0] += 1
+    histogram[2] = max(histogram[2], seconds)
+    histogram[3][bucket] = histogram[3].get(bucket, 0) + 1
+
+  assert metrics.percentile(histogram, 50) == \
+      pytest.approx(0.001, rel=0.2)
+  assert metrics.percentile(histogram, 90) == \
+      pytest.approx(0.001, rel=0.2)
+  assert metrics.percentile(histogram, 99) == 0.1
+  assert metrics.percentile(histogram, 100) == 0.1
+
+def test_round_trip(enabled):
+  metrics.count('clicks')
+  metrics.observe('update', 0.002)
+  metrics.flush()
+
+  metrics.count('clicks', 2)
+  metrics.count('skipped')
+  metrics.observe('update', 0.004)
+  metrics.observe('update', 0.001)
+  metrics.flush()
+
+  # Nothing recorded since, so nothing is written
+  metrics.flush()
+
+  lines = enabled.read_text().splitlines()
+  assert len(lines) == 2
+  assert all(isinstance(key, str)
+             for line in lines for key in json.loads(line)['h']['update'][3])
+
+  counters, histograms = metrics.read_metrics(str(enabled))
+  num, total, longest, buckets = histograms['update']
+
+  assert counters == {'clicks': 3, 'skipped': 1}
+  assert num == 3
+  assert total == pytest.approx(0.007)
+  assert longest == 0.004
+  assert all(isinstance(x, int) for x in buckets)
+  assert sum(buckets.values()) == 3
+  assert buckets[metrics.bucket_of(0.002)] == 1
+
+def test_bad_lines_are_skipped(enabled):
+  metrics.count('clicks')
+  metrics.flush()
+  with open(str(enabled), 'a') as f:
+    f.write('{"c": {"cli\n')
+
+  assert metrics.read_metrics(str(enabled))[0] == {'clicks': 1}
+
+def test_flushed_once_when_stale(enabled, monkeypatch):
+  monkeypatch.setattr(metrics, 'last_flush', 0)
+  threads = [threading.Thread(target=metrics.count, args=('clicks',))
+             for _ in range(8)]
+  for thread in threads:
+    thread.start()
+  for thread in threads:
+    thread.join()
+  metrics.flush()
+
+  lines = enabled.read_text().splitlines()
+  assert metrics.read_metrics(str(enabled))[0] == {'clicks': 8}
+  # The first count writes, the rest are left for the last flush
+  assert len(lines) == 2
+
+def test_timed_and_timer(enabled):
+  @metrics.timed('work')
+  def work():
+    return 42
+
+  assert work() == 42
+  with metrics.timer('block'):
+    pass
+
+  assert metrics.histograms['work'][0] == 1
+  assert metrics.histograms['block'][0] == 1
+
+def test_disabled(tmp_path, monkeypatch):
+  monkeypatch.setattr(metrics, 'ENABLED', False)
+  monkeypatch.setattr(metrics, 'PATH', str(tmp_path / 'metrics.log'))
+  monkeypatch.setattr(metrics, 'counters', {})
+  monkeypatch.setattr(metrics, 'histograms', {})
+
+  def work():
+    return 42
+
+  assert metrics.timed('work')(work) is work
+  assert metrics.timer('block') is metrics.NULL_TIMER
+
+  metrics.count('clicks')
+  metrics.observe('update', 1)
+  metrics.flush()
+  assert not (tmp_path / 'metrics.log').exists()
+
+def test_main(enabled, capsys):
+  metrics.count('clicks', 5)
+  metrics.observe('update', 0.002)
+  metrics.flush()
+
+  metrics.main([str(enabled), '--clear'])
+  output = capsys.readouterr().out
+
+  assert 'clicks' in output and '5' in output
+  assert 'update' in output
+  assert enabled.read_text() == ''
@@ -0,0 +1,122 @@
+import threading
+import os
+
+import pytest
+
+from fake_mpd import FakeMpd
+from fixtures import make_songs, write_fake_mpc
+from lib.mpd import MpdClient, MpdConnectionError, MpdError, Mpc
+
+@pytest.fixture
+def songs():
+  return make_songs(20)
+
+@pytest.fixture
+def mpd(songs):
+  mpd = FakeMpd(songs)
+  yield mpd
+  mpd.close()
+
+def test_connect(mpd):
+  client = MpdClient(mpd.socket_path)
+  status = dict(client.command('status'))
+
+  assert client.is_connected()
+  assert status['state'] == 'play'
+  assert status['playlistlength'] == '20'
+
+def test_reconnect_after_drop(mpd):
+  client = MpdClient(mpd.socket_path)
+  client.command('status')
+
+  mpd.drop_connections()
+
+  assert dict(client.command('status'))['state'] == 'play'
+  assert mpd.count('status') == 2
+
+def test_sent_command_is_not_resent(mpd):
+  client = MpdClient(mpd.socket_path)
+  client.command('status')
+  mpd.drop_on.add('next')
+
+  with pytest.raises(MpdConnectionError):
+    client.command('next')
+
+  assert mpd.count('next') == 1
+  assert mpd.current == 0
+
+def test_sent_command_list_is_not_resent(mpd):
+  client = MpdClient(mpd.socket_path)
+  mpd.drop_on.add('status')
+
+  with pytest.raises(MpdConnectionError):
+    client.command_list([('next', ()), ('status', ())])
+
+  assert mpd.count('next') == 1
+  assert mpd.current == 1
+
+def test_ack(mpd):
+  client = MpdClient(mpd.socket_path)
+
+  with pytest.raises(MpdError) as e:
+    client.command('nonsense')
+
+  assert not isinstance(e.value, MpdConnectionError)
+  assert 'nonsense' in str(e.value)
+
+  # The connection can still be used after an ACK
+  assert dict(client.command('status'))['state'] == 'play'
+
+def test_run_mpc_fallback(tmp_path, monkeypatch, songs):
+  write_fake_mpc(str(tmp_path), songs)
+  monkeypatch.setenv('PATH', '%s%s%s' % (tmp_path, os.pathsep,
+                                         os.environ.get('PATH', '')))
+
+  mpc = Mpc(MpdClient(str(tmp_path / 'none.sock')))
+
+  assert not mpc.client.is_connected()
+  assert mpc.artist == songs[0]['Artist']
+  assert mpc.song == songs[0]['Title']
+  assert [x['name'] for x in mpc.get_playlist()][:2] == \
+      ['%s - %s' % (x['Artist'], x['Title']) for x in songs[:2]]
+
+def test_toggle_status_uses_current_status(mpd):
+  mpc = Mpc(MpdClient(mpd.socket_path))
+  assert mpc.is_playing()
+
+  # Paused by something else, so the cached status is stale
+  MpdClient(mpd.socket_path).command('pause', '1')
+
+  mpc.toggle_status()
+
+  assert mpd.state == 'play'
+  assert mpc.is_playing()
+
+def test_batch_is_per_thread(mpd):
+  mpc = Mpc(MpdClient(mpd.socket_path))
+  statuses = mpd.count('status')
+
+  with mpc.batch():
+    mpc.set_volume(20)
+
+    # Like the listening thread updating the class meanwhile
+    thread = threading.Thread(target=mpc.update)
+    thread.start()
+    thread.join()
+
+    assert mpd.count('status') == statuses + 1
+    assert mpd.volume == 50
+    assert len(mpc.batched) == 1
+    assert not mpc.batch_update
+
+  assert mpd.volume == 20
+
+def test_command_inside_command_iter(mpd):
+  mpc = Mpc(MpdClient(mpd.socket_path))
+
+  with pytest.raises(RuntimeError):
+    for song in mpc.iter_playlist():
+      mpc.play(song)
+
+  # The client can be used again once the generator is gone
+  assert len(mpc.get_playlist()) == 20
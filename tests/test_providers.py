@@ -0,0 +1,187 @@
+from lib.providers import bandwidth, battery, temperature
+from lib.providers.bandwidth import BandwidthBlock, RateMeter, format_rate
+from lib.providers.battery import BatteryBlock, find_batteries
+from lib.providers.temperature import TemperatureBlock, find_core_sensors
+
+class FakeTime():
+  """Stands in for the time module of a provider, moved on by hand"""
+  def __init__(self):
+    self.now = 1000.0
+
+  def monotonic(self):
+    return self.now
+
+  def monotonic_ns(self):
+    return int(self.now * 1e9)
+
+def without_icons(text):
+  """Leaves out the icons, which are in the private use area of the font"""
+  return ''.join(x for x in text if not '\ue000' <= x <= '\uf8ff')
+
+def write(path, text):
+  path.parent.mkdir(parents=True, exist_ok=True)
+  path.write_text('%s\n' % text)
+
+# Bandwidth
+
+def write_interface(root, name, tx, rx, up=True):
+  write(root / name / 'carrier', '1' if up else '0')
+  write(root / name / 'operstate', 'up' if up else 'down')
+  write(root / name / 'statistics' / 'tx_bytes', tx)
+  write(root / name / 'statistics' / 'rx_bytes', rx)
+
+def test_rate_meter():
+  meter = RateMeter(history=2)
+  meter.add(0, 0)
+  assert meter.current() == 0
+
+  meter.add(1000, 2 * 10**9)
+  meter.add(4000, 3 * 10**9)
+  meter.add(4000, 4 * 10**9)
+
+  assert meter.rates[0] == 24000
+  assert meter.current() == 0
+  assert meter.average() == 12000
+  assert meter.peak() == 24000
+
+def test_format_rate():
+  assert format_rate(512) == '512.0b '
+  assert format_rate(1536 * 1024) == '  1.5m '
+
+def test_bandwidth(tmp_path, monkeypatch):
+  clock = FakeTime()
+  monkeypatch.setattr(bandwidth, 'time', clock)
+  write_interface(tmp_path, 'lo', 0, 0)
+  write_interface(tmp_path, 'eth0', 0, 0)
+  write_interface(tmp_path, 'wlan0', 0, 0, up=False)
+  block = BandwidthBlock('bandwidth', root=str(tmp_path))
+
+  assert block.update() == '⇅   0.0b  /   0.0b '
+
+  clock.now += 2
+  write_interface(tmp_path, 'eth0', 256, 2048 * 256)
+
+  assert block.update() == '⇅ 1024.0b /   2.0m '
+
+def test_bandwidth_interface_gone(tmp_path, monkeypatch):
+  monkeypatch.setattr(bandwidth, 'time', FakeTime())
+  block = BandwidthBlock('bandwidth', interface='eth0', root=str(tmp_path))
+
+  assert block.update() == ''
+
+# Temperature
+
+def test_temperature(tmp_path):
+  write(tmp_path / 'hwmon0' / 'name', 'acpitz')
+  write(tmp_path / 'hwmon0' / 'temp1_input', 90000)
+  write(tmp_path / 'hwmon1' / 'name', 'coretemp')
+  write(tmp_path / 'hwmon1' / 'temp1_input', 60000)
+  write(tmp_path / 'hwmon1' / 'temp1_label', 'Package id 0')
+  write(tmp_path / 'hwmon1' / 'temp2_input', 40500)
+  write(tmp_path / 'hwmon1' / 'temp2_label', 'Core 0')
+  write(tmp_path / 'hwmon1' / 'temp3_input', 45000)
+  write(tmp_path / 'hwmon1' / 'temp3_label', 'Core 1')
+
+  assert find_core_sensors(str(tmp_path)) == [
+      str(tmp_path / 'hwmon1' / 'temp2_input'),
+      str(tmp_path / 'hwmon1' / 'temp3_input')]
+  assert without_icons(TemperatureBlock('temp', root=str(tmp_path))
+                       .update()) == '<span> 42°C</span>'
+
+def test_temperature_unlabeled(tmp_path):
+  write(tmp_path / 'hwmon0' / 'name', 'k10temp')
+  write(tmp_path / 'hwmon0' / 'temp1_input', 80000)
+
+  assert '#fc2f2f' in TemperatureBlock('temp', root=str(tmp_path)).update()
+
+def test_temperature_missing_hwmon(tmp_path):
+  # A hwmon node without a name, like one whose driver went away
+  (tmp_path / 'hwmon0').mkdir()
+  block = TemperatureBlock('temp', root=str(tmp_path / 'hwmon'))
+
+  assert find_core_sensors(str(tmp_path)) == []
+  assert block.update() == ''
+
+def test_temperature_sensor_removed(tmp_path):
+  write(tmp_path / 'hwmon0' / 'name', 'coretemp')
+  write(tmp_path / 'hwmon0' / 'temp1_input', 40000)
+  write(tmp_path / 'hwmon0' / 'temp1_label', 'Core 0')
+  block = TemperatureBlock('temp', root=str(tmp_path))
+  assert without_icons(block.update()) == '<span> 40°C</span>'
+
+  (tmp_path / 'hwmon0' / 'temp1_input').unlink()
+
+  assert block.update() == ''
+  assert block.sensors is None
+
+# Battery
+
+def write_battery(path, status, now, full, rate, prefix='energy'):
+  write(path / 'type', 'Battery')
+  write(path / 'status', status)
+  write(path / ('%s_now' % prefix), now)
+  write(path / ('%s_full' % prefix), full)
+  write(path / ('power_now' if prefix == 'energy' else 'current_now'), rate)
+
+def test_battery_from_power(tmp_path, monkeypatch):
+  monkeypatch.setattr(battery, 'time', FakeTime())
+  write(tmp_path / 'AC' / 'type', 'Mains')
+  write_battery(tmp_path / 'BAT0', 'Discharging', 30000000, 40000000,
+                10000000)
+
+  # 30 Wh left at 10 W
+  assert without_icons(BatteryBlock('battery', root=str(tmp_path))
+                       .update()) == \
+      '<span color="#00BB00"> 75% (~3h 00m)</span>'
+
+def test_battery_from_history(tmp_path, monkeypatch):
+  clock = FakeTime()
+  monkeypatch.setattr(battery, 'time', clock)
+  write_battery(tmp_path / 'BAT0', 'Charging', 1000000, 4000000, 0,
+                prefix='charge')
+  block = BatteryBlock('battery', root=str(tmp_path))
+
+  assert without_icons(block.update()) == '<span color="#BBBB00"> 25%</span>'
+
+  # Charged 100 mAh in 6 minutes, so 2.9 Ah takes 2h 54m
+  clock.now += 360
+  write_battery(tmp_path / 'BAT0', 'Charging', 1100000, 4000000, 0,
+                prefix='charge')
+
+  assert without_icons(block.update()) == \
+      '<span color="#BBBB00"> 27% (~2h 54m)</span>'
+
+def test_battery_two_batteries(tmp_path, monkeypatch):
+  monkeypatch.setattr(battery, 'time', FakeTime())
+  write_battery(tmp_path / 'BAT0', 'Full', 20000000, 20000000, 0)
+  write_battery(tmp_path / 'BAT1', 'Discharging', 0, 20000000, 0)
+
+  assert without_icons(BatteryBlock('battery', root=str(tmp_path))
+                       .update()) == '<span color="#00BB00"> 50%</span>'
+
+def test_battery_without_energy(tmp_path, monkeypatch):
+  monkeypatch.setattr(battery, 'time', FakeTime())
+  write(tmp_path / 'BAT0' / 'type', 'Battery')
+  write(tmp_path / 'BAT0' / 'status', 'Unknown')
+  write(tmp_path / 'BAT0' / 'capacity', 64)
+
+  assert find_batteries(str(tmp_path))[0].full() == 0
+  assert without_icons(BatteryBlock('battery', root=str(tmp_path))
+                       .update()) == '<span color="#00BB00"> 64%</span>'
+
+def test_no_battery(tmp_path):
+  write(tmp_path / 'AC' / 'type', 'Mains')
+
+  assert find_batteries(str(tmp_path)) == []
+  assert BatteryBlock('battery', root=str(tmp_path)).update() == ''
+
+def test_battery_removed(tmp_path, monkeypatch):
+  monkeypatch.setattr(battery, 'time', FakeTime())
+  write_battery(tmp_path / 'BAT0', 'Full', 100, 100, 0)
+  block = BatteryBlock('battery', root=str(tmp_path))
+  assert '100%' in block.update()
+
+  (tmp_path / 'BAT0' / 'status').unlink()
+
+  assert block.update() == ''
+  assert block.batteries is None
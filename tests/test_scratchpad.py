@@ -0,0 +1,31 @@
+import pytest
+
+from lib import scratchpad
+from lib.scratchpad import ScratchpadCounter
+
+class Stop(Exception):
+  """Raised instead of sleeping, to get out of the loop of `run`"""
+
+def run_once(monkeypatch, error):
+  def connect():
+    raise error
+
+  def sleep(seconds):
+    raise Stop()
+
+  monkeypatch.setattr(scratchpad.i3ipc, 'Connection', connect)
+  monkeypatch.setattr(scratchpad.time, 'sleep', sleep)
+
+  with pytest.raises(Stop):
+    ScratchpadCounter(lambda *args: None).run()
+
+def test_lost_connection_is_quiet(monkeypatch, caplog):
+  run_once(monkeypatch, ConnectionRefusedError(111, 'Connection refused'))
+
+  assert not caplog.records
+
+def test_bug_is_logged(monkeypatch, caplog):
+  run_once(monkeypatch, NameError("name 'windwos' is not defined"))
+
+  assert 'Unable to count' in caplog.text
+  assert 'windwos' in caplog.text
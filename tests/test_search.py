@@ -0,0 +1,37 @@
+import random
+
+from lib.search import SearchIndex, SCAN_LIMIT
+
+from fixtures import make_songs, song_names
+
+NAMES = song_names(make_songs(5000))
+
+def expected(names, text):
+  words = text.lower().split()
+  return [x for x in names if all(word in x.lower() for word in words)]
+
+def test_multi_word_after_unrelated_query():
+  index = SearchIndex(NAMES)
+  index.filter('foo')
+  assert index.filter('dead ships') == expected(NAMES, 'dead ships')
+
+def test_backspace_does_not_narrow():
+  index = SearchIndex(NAMES)
+  index.filter('in dead')
+  assert index.filter('in dea') == expected(NAMES, 'in dea')
+
+def test_few_candidates_are_scanned():
+  # Few enough strings that the second word is scanned for
+  # among what the first one found
+  names = NAMES[:SCAN_LIMIT // 2]
+  index = SearchIndex(names)
+  assert index.filter('ships dwell') == expected(names, 'ships dwell')
+
+def test_random_queries():
+  index = SearchIndex(NAMES)
+  rand = random.Random(4)
+  words = ['in', 'dead', 'ships', 'de', 'a', 'sh', 'the', 'flames', 'x', '']
+
+  for _ in range(500):
+    text = ' '.join(rand.choice(words) for _ in range(rand.randint(0, 3)))
+    assert index.filter(text) == expected(NAMES, text), text
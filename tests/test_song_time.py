@@ -0,0 +1,16 @@
+from lib.mpd import SongTime
+
+def test_increase_does_not_add():
+  song_time = SongTime('1:00', '4:00')
+
+  assert not song_time.increase(5)
+  assert song_time.current == 60
+
+def test_increase_finished():
+  assert SongTime('4:00', '4:00').increase()
+
+def test_fraction_is_clamped():
+  assert SongTime('1:00', '4:00').as_fraction() == 0.25
+  assert SongTime('5:00', '4:00').as_fraction() == 1
+  assert SongTime.from_seconds(-3, 240).as_fraction() == 0
+  assert SongTime('1:00', '0:00').as_fraction() == 0
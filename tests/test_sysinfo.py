@@ -0,0 +1,43 @@
+import pytest
+
+from lib.sysinfo import CpuSampler, MemorySampler
+
+def write_stat(path, *cpus):
+  lines = ['%s %s 0 0\n' % (name, ' '.join(str(x) for x in times))
+           for name, times in cpus]
+  path.write_text(''.join(lines) + 'intr 1 2 3\n')
+
+def test_cpu_usage(tmp_path):
+  path = tmp_path / 'stat'
+  write_stat(path, ('cpu', [100, 0, 100, 800, 0, 0, 0, 0]),
+             ('cpu0', [50, 0, 50, 400, 0, 0, 0, 0]))
+  sampler = CpuSampler(str(path))
+
+  # The first sample is the usage since boot
+  assert sampler.sample()['cpu'] == pytest.approx(20)
+
+  # 300 used out of 400, the iowait counted as used
+  write_stat(path, ('cpu', [300, 0, 150, 900, 50, 0, 0, 0]),
+             ('cpu0', [50, 0, 50, 400, 0, 0, 0, 0]))
+  usage = sampler.sample()
+
+  assert usage['cpu'] == pytest.approx(75)
+  assert usage['cpu0'] == 0.0
+
+def test_missing_stat(tmp_path):
+  with pytest.raises(OSError):
+    CpuSampler(str(tmp_path / 'stat')).sample()
+
+def test_memory_available(tmp_path):
+  path = tmp_path / 'meminfo'
+  path.write_text('MemTotal: 1000 kB\nMemFree: 100 kB\n'
+                  'MemAvailable: 600 kB\nCached: 300 kB\n')
+
+  assert MemorySampler(str(path)).sample() == (400, 1000)
+
+def test_memory_without_available(tmp_path):
+  path = tmp_path / 'meminfo'
+  path.write_text('MemTotal: 1000 kB\nMemFree: 100 kB\nBuffers: 50 kB\n'
+                  'Cached: 200 kB\nSReclaimable: 50 kB\n')
+
+  assert MemorySampler(str(path)).sample() == (600, 1000)
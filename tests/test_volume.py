@@ -0,0 +1,166 @@
+import asyncio
+import ctypes.util
+import stat
+import io
+import os
+
+import pytest
+
+from lib import alsa
+from lib.alsa import Mixer, percent_of, value_of
+from lib.i3bar import Bar
+from lib.providers import volume
+from lib.providers.volume import AmixerControl, VolumeBlock
+
+class FakeElement():
+  """A control that is changed by hand instead of by libasound"""
+  def __init__(self):
+    self.volume = 40
+    self.on = True
+
+  def read(self):
+    return self.volume, self.on
+
+  def change(self, step):
+    self.volume += step
+    return self.read()
+
+  def toggle(self):
+    self.on = not self.on
+    return self.read()
+
+class FakeMixer(Mixer):
+  """
+    A Mixer without libasound, where writing to `write_fd` is what
+    a change of a control would be. With `gone` set, handling the
+    events fails like it does once the card went away
+  """
+  def __init__(self, card='default'):
+    self.elements = {}
+    self.callbacks = []
+    self.lost_callbacks = []
+    self.loop = None
+    self.watched = []
+    self.read_fd, self.write_fd = os.pipe()
+    self.gone = False
+    self.handled = 0
+
+  def element(self, name, index=0):
+    return self.elements.setdefault((name, index), FakeElement())
+
+  def fds(self):
+    return [self.read_fd]
+
+  def handle_events(self):
+    self.handled += 1
+    if self.gone:
+      raise OSError(19, 'No such device')
+    os.read(self.read_fd, 4096)
+
+  def close(self):
+    os.close(self.read_fd)
+    os.close(self.write_fd)
+
+@pytest.fixture
+def loop():
+  loop = asyncio.new_event_loop()
+  yield loop
+  loop.close()
+
+@pytest.fixture
+def mixers(monkeypatch):
+  mixers = {}
+  monkeypatch.setattr(volume, 'mixers', mixers)
+  yield mixers
+  for mixer in mixers.values():
+    mixer.close()
+
+def start(loop, *blocks):
+  bar = Bar(list(blocks), loop=loop, output=io.StringIO())
+  for block in blocks:
+    block.start(bar)
+    block.refresh()
+  return bar
+
+def text(block):
+  """The volume the block shows, without its icon"""
+  return block.output['full_text'].split(' ')[-1].split('<')[0]
+
+def test_percent():
+  assert percent_of(0, 0, 87) == 0
+  assert percent_of(87, 0, 87) == 100
+  assert percent_of(5, 5, 5) == 0
+  assert value_of(percent_of(40, 0, 87), 0, 87) == 40
+
+def test_event_refreshes(loop, mixers, monkeypatch):
+  monkeypatch.setattr(volume, 'Mixer', FakeMixer)
+  master = VolumeBlock('volume', 'Master')
+  capture = VolumeBlock('mic', 'Capture')
+  start(loop, master, capture)
+
+  mixer = mixers['default']
+  shown = capture.output
+  assert text(master) == '40%'
+  assert len(mixer.callbacks) == 2
+
+  # Changed by something else, such as a media key
+  mixer.element('Master').volume = 65
+  os.write(mixer.write_fd, b'x')
+  loop.run_until_complete(asyncio.sleep(0.05))
+
+  assert text(master) == '65%'
+  assert capture.output == shown
+
+def test_click(loop, mixers, monkeypatch):
+  monkeypatch.setattr(volume, 'Mixer', FakeMixer)
+  block = VolumeBlock('volume', 'Master', step=5)
+  start(loop, block)
+
+  block.refresh({'button': 4})
+  assert text(block) == '45%'
+  block.refresh({'button': 3})
+  assert 'FF0000' in block.output['full_text']
+
+def fake_amixer(directory, monkeypatch):
+  """Puts an amixer that always gives 42% first in PATH"""
+  amixer = directory / 'amixer'
+  amixer.write_text("#!/bin/sh\n"
+                    "echo '  Front Left: Playback 42 [42%] [-21.00dB] [on]'\n")
+  amixer.chmod(amixer.stat().st_mode | stat.S_IXUSR)
+  monkeypatch.setenv('PATH', '%s%s%s' % (directory, os.pathsep,
+                                         os.environ.get('PATH', '')))
+
+def test_falls_back_to_amixer(tmp_path, loop, mixers, monkeypatch):
+  monkeypatch.setattr(ctypes.util, 'find_library', lambda name: None)
+
+  with pytest.raises(OSError):
+    alsa.Mixer()
+
+  fake_amixer(tmp_path, monkeypatch)
+
+  block = VolumeBlock('volume', 'Master')
+  start(loop, block)
+
+  assert isinstance(block.mixer, AmixerControl)
+  assert mixers == {}
+  assert text(block) == '42%'
+
+def test_card_gone(tmp_path, loop, mixers, monkeypatch):
+  monkeypatch.setattr(volume, 'Mixer', FakeMixer)
+  fake_amixer(tmp_path, monkeypatch)
+  master = VolumeBlock('volume', 'Master')
+  capture = VolumeBlock('mic', 'Capture')
+  start(loop, master, capture)
+
+  mixer = mixers['default']
+  mixer.gone = True
+  os.write(mixer.write_fd, b'x')
+  loop.run_until_complete(asyncio.sleep(0.05))
+
+  # Handled once, rather than over and over as the pipe stays readable
+  assert mixer.handled == 1
+  assert mixer.watched == []
+  assert mixers == {}
+  assert isinstance(master.mixer, AmixerControl)
+  assert isinstance(capture.mixer, AmixerControl)
+  assert text(master) == '42%'